@@ -1,123 +1,147 @@
 import logging
 import numpy as np
-from typing import Dict, List, Tuple
+from typing import Dict, Iterator, List, Sequence, Union
 
 logger = logging.getLogger(__name__)
 
+AXES = ('x', 'y', 'z')
+
+class KeyframeTrack:
+    """Animation keyframes stored as contiguous float32 arrays.
+
+    ``values`` is an (n, 6) array of position xyz followed by rotation xyz;
+    ``position`` and ``rotation`` are views into it. Indexing and iteration
+    yield the keyframe dicts used by the rest of the code.
+    """
+
+    def __init__(self, timestamps: np.ndarray, values: np.ndarray):
+        self.timestamps = np.ascontiguousarray(timestamps, dtype=np.float32)
+        self.values = np.ascontiguousarray(values, dtype=np.float32).reshape(len(self.timestamps), 6)
+
+    @property
+    def position(self) -> np.ndarray:
+        return self.values[:, :3]
+
+    @property
+    def rotation(self) -> np.ndarray:
+        return self.values[:, 3:]
+
+    @classmethod
+    def zeros(cls, duration: float, fps: float) -> 'KeyframeTrack':
+        """Track of neutral keyframes at fps covering duration"""
+        total_frames = max(int(duration * fps), 0)
+        timestamps = np.arange(total_frames, dtype=np.float32) / fps
+        return cls(timestamps, np.zeros((total_frames, 6), dtype=np.float32))
+
+    @classmethod
+    def from_keyframes(cls, keyframes: Sequence[Dict]) -> 'KeyframeTrack':
+        """Build a track from a list of keyframe dicts"""
+        if isinstance(keyframes, cls):
+            return keyframes
+        values = np.array(
+            [[k[prop][axis] for prop in ('position', 'rotation') for axis in AXES] for k in keyframes],
+            dtype=np.float32
+        )
+        return cls(np.array([k['timestamp'] for k in keyframes]), values.reshape(-1, 6))
+
+    def sample(self, timestamps: Union[np.ndarray, Sequence[float]]) -> np.ndarray:
+        """Interpolate the (len(timestamps), 6) pose at arbitrary times"""
+        t = np.asarray(timestamps, dtype=np.float32)
+        if not len(self):
+            return np.zeros((len(t), 6), dtype=np.float32)
+        return np.stack(
+            [np.interp(t, self.timestamps, self.values[:, i]) for i in range(6)], axis=1
+        ).astype(np.float32)
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def __getitem__(self, index: int) -> Dict:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        row = self.values[index]
+        return {
+            'position': {axis: float(row[i]) for i, axis in enumerate(AXES)},
+            'rotation': {axis: float(row[3 + i]) for i, axis in enumerate(AXES)},
+            'timestamp': float(self.timestamps[index])
+        }
+
+    def __iter__(self) -> Iterator[Dict]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def to_list(self) -> List[Dict]:
+        return list(self)
+
 class AnimationEngine:
-    def __init__(self):
+    def __init__(self, fps: float = 30):
+        self.fps = fps
         self.gestures = {
             'idle': self._generate_idle_motion,
             'talk': self._generate_talk_motion,
             'nod': self._generate_nod_motion
         }
 
-    def _generate_idle_motion(self, duration: float) -> List[Dict[str, float]]:
+    def _generate_idle_motion(self, duration: float) -> KeyframeTrack:
         """Generate subtle idle animation keyframes"""
         try:
-            frames = []
-            fps = 30
-            total_frames = int(duration * fps)
-            
-            for frame in range(total_frames):
-                t = frame / fps
-                # Subtle breathing motion
-                y_offset = np.sin(t * 2 * np.pi * 0.3) * 0.05
-                
-                frames.append({
-                    'position': {'x': 0, 'y': y_offset, 'z': 0},
-                    'rotation': {'x': 0, 'y': 0, 'z': 0},
-                    'timestamp': t
-                })
-            
-            return frames
+            track = KeyframeTrack.zeros(duration, self.fps)
+            # Subtle breathing motion
+            track.position[:, 1] = np.sin(track.timestamps * (2 * np.pi * 0.3)) * 0.05
+            return track
         except Exception as e:
             logger.error(f"Error generating idle motion: {str(e)}")
-            return []
+            return KeyframeTrack.zeros(0, self.fps)
 
-    def _generate_talk_motion(self, duration: float, amplitude: float = 1.0) -> List[Dict[str, float]]:
+    def _generate_talk_motion(self, duration: float, amplitude: float = 1.0) -> KeyframeTrack:
         """Generate talking animation keyframes"""
         try:
-            frames = []
-            fps = 30
-            total_frames = int(duration * fps)
-            
-            for frame in range(total_frames):
-                t = frame / fps
-                # Head movement during speech
-                head_rot = np.sin(t * 2 * np.pi * 2) * 0.1 * amplitude
-                
-                frames.append({
-                    'position': {'x': 0, 'y': 0, 'z': 0},
-                    'rotation': {'x': head_rot, 'y': 0, 'z': 0},
-                    'timestamp': t
-                })
-            
-            return frames
+            track = KeyframeTrack.zeros(duration, self.fps)
+            # Head movement during speech
+            track.rotation[:, 0] = np.sin(track.timestamps * (2 * np.pi * 2)) * (0.1 * amplitude)
+            return track
         except Exception as e:
             logger.error(f"Error generating talk motion: {str(e)}")
-            return []
+            return KeyframeTrack.zeros(0, self.fps)
 
-    def _generate_nod_motion(self, duration: float) -> List[Dict[str, float]]:
+    def _generate_nod_motion(self, duration: float) -> KeyframeTrack:
         """Generate nodding animation keyframes"""
         try:
-            frames = []
-            fps = 30
-            total_frames = int(duration * fps)
-            
-            for frame in range(total_frames):
-                t = frame / fps
-                # Nodding motion
-                head_rot = np.sin(t * 2 * np.pi * 2) * 0.2
-                
-                frames.append({
-                    'position': {'x': 0, 'y': 0, 'z': 0},
-                    'rotation': {'x': head_rot, 'y': 0, 'z': 0},
-                    'timestamp': t
-                })
-            
-            return frames
+            track = KeyframeTrack.zeros(duration, self.fps)
+            # Nodding motion
+            track.rotation[:, 0] = np.sin(track.timestamps * (2 * np.pi * 2)) * 0.2
+            return track
         except Exception as e:
             logger.error(f"Error generating nod motion: {str(e)}")
-            return []
+            return KeyframeTrack.zeros(0, self.fps)
 
-    def generate_animation(self, duration: float, gesture_type: str = 'talk') -> List[Dict[str, float]]:
+    def generate_animation(self, duration: float, gesture_type: str = 'talk') -> KeyframeTrack:
         """Generate animation frames for the specified gesture"""
         try:
             if gesture_type not in self.gestures:
                 logger.warning(f"Unknown gesture type: {gesture_type}, falling back to idle")
                 gesture_type = 'idle'
-            
+
             return self.gestures[gesture_type](duration)
         except Exception as e:
             logger.error(f"Error generating animation: {str(e)}")
             return self._generate_idle_motion(duration)
 
-    def blend_animations(self, animations: List[List[Dict[str, float]]], weights: List[float]) -> List[Dict[str, float]]:
+    def blend_animations(self, animations: List[Union[KeyframeTrack, List[Dict]]],
+                         weights: List[float]) -> KeyframeTrack:
         """Blend multiple animations together using weights"""
         try:
             if not animations or not weights or len(animations) != len(weights):
                 raise ValueError("Invalid animations or weights")
-                
-            result = []
-            base_frames = len(animations[0])
-            
-            for frame_idx in range(base_frames):
-                blended_frame = {
-                    'position': {'x': 0, 'y': 0, 'z': 0},
-                    'rotation': {'x': 0, 'y': 0, 'z': 0},
-                    'timestamp': animations[0][frame_idx]['timestamp']
-                }
-                
-                for anim, weight in zip(animations, weights):
-                    frame = anim[frame_idx]
-                    for prop in ['position', 'rotation']:
-                        for axis in ['x', 'y', 'z']:
-                            blended_frame[prop][axis] += frame[prop][axis] * weight
-                
-                result.append(blended_frame)
-            
-            return result
+
+            tracks = [KeyframeTrack.from_keyframes(anim) for anim in animations]
+            frames = min(len(track) for track in tracks)
+
+            # (k, frames, 6) stack collapsed by a single weighted sum over k
+            stacked = np.stack([track.values[:frames] for track in tracks])
+            blended = np.tensordot(np.asarray(weights, dtype=np.float32), stacked, axes=1)
+
+            return KeyframeTrack(tracks[0].timestamps[:frames], blended)
         except Exception as e:
             logger.error(f"Error blending animations: {str(e)}")
-            return animations[0] if animations else []
\ No newline at end of file
+            return KeyframeTrack.from_keyframes(animations[0]) if animations else KeyframeTrack.zeros(0, self.fps)
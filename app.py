@@ -1,12 +1,26 @@
 import os
+import gzip
+import json
+import time
 import logging
-from flask import Flask, render_template, request, jsonify, send_file
-from flask_sqlalchemy import SQLAlchemy
-from tts_engine import generate_speech
-from avatars import get_random_avatars
-from video_processor import create_video
-from utils import cleanup_old_files
-from models import db, VideoGeneration  # Import `db` after initializing
+import threading
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy.exc import IntegrityError
+from flask import (Flask, Response, render_template, request, jsonify, send_file, send_from_directory,
+                   stream_with_context)
+from job_queue import RenderQueue
+from metrics import registry, cache_gauges, render_seconds, renders_total, timed, track_job
+from progress import progress_hub, track_progress
+from tts_engine import generate_speech, speech_cache, speech_cache_key, speech_metadata
+from avatars import get_random_avatars, avatar_pool
+from avatar_store import avatar_store
+from video_processor import (create_video, create_video_streaming, get_profile, render_fingerprint,
+                             DEFAULT_PROFILE, DEFAULT_RENDER_MODE, STREAMING_RENDER)
+from segments import create_segmented_video, split_sentences, segment_cache
+from artifacts import artifact_store
+from timeline import build_timeline_async, get_timeline_path, lookup_timeline, timeline_cache
+from batches import BatchError, parse_batch_file, normalize_batch_items, batch_progress, batch_items, prefetch_speech
+from models import db, VideoGeneration, Batch, BatchItem, upgrade_schema  # Import `db` after initializing
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -19,12 +33,52 @@ app.secret_key = os.environ.get("SESSION_SECRET", "default-secret-key")
 # Set database (SQLite as default)
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///database.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    # Render workers and request threads share the pool
+    'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+    'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+    'pool_pre_ping': True,
+    'pool_recycle': 1800
+}
+
+# A 'processing' row whose heartbeat is older than this lost its worker; it is
+# re-queued, or failed once it has been claimed RENDER_MAX_ATTEMPTS times
+RENDER_STALE_SECONDS = float(os.environ.get('RENDER_STALE_SECONDS', 120))
+RENDER_MAX_ATTEMPTS = int(os.environ.get('RENDER_MAX_ATTEMPTS', 3))
+# Queued rows an idle render thread considers per poll; it tries to claim
+# them oldest first
+RENDER_POLL_BATCH = 8
+# Retries for the commit that records a finished render
+OUTCOME_COMMIT_RETRIES = 3
+
+# Page size limits for /generations
+GENERATIONS_PAGE_SIZE = 20
+GENERATIONS_MAX_PAGE_SIZE = 100
 
 # Initialize SQLAlchemy
 db.init_app(app)
 
 # Ensure output directory exists
-os.makedirs("output", exist_ok=True)
+OUTPUT_DIR = os.path.abspath("output")
+os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+# Hand file bodies to the front-end server instead of streaming them from a
+# worker: 'sendfile' (X-Sendfile, Apache/lighttpd) or 'accel' (nginx
+# X-Accel-Redirect to DOWNLOAD_ACCEL_PREFIX, an internal location aliased to output/)
+DOWNLOAD_OFFLOAD = os.environ.get('DOWNLOAD_OFFLOAD', '').lower()
+DOWNLOAD_ACCEL_PREFIX = os.environ.get('DOWNLOAD_ACCEL_PREFIX', '/protected-output/')
+app.config['USE_X_SENDFILE'] = DOWNLOAD_OFFLOAD == 'sendfile'
+
+# Files under output/cache are named by a hash of their content and never change
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+DOWNLOAD_MAX_AGE = int(os.environ.get('DOWNLOAD_MAX_AGE', 3600))
+
+# /jobs/<id>/events: how often to re-read the job row when no live progress
+# arrives, the keepalive interval, and how long one stream lasts before the
+# browser reconnects
+SSE_POLL_SECONDS = float(os.environ.get('SSE_POLL_SECONDS', 1.0))
+SSE_KEEPALIVE_SECONDS = 15
+SSE_MAX_SECONDS = float(os.environ.get('SSE_MAX_SECONDS', 300))
 
 @app.route('/')
 def index():
@@ -63,12 +117,265 @@ def preview_voice():
 
         return jsonify({
             'status': 'success',
-            'audio_url': f'/download/{os.path.basename(audio_path)}'
+            'audio_url': f"/download/{os.path.relpath(audio_path, 'output').replace(os.sep, '/')}?inline=1"
         })
     except Exception as e:
         logger.error(f"Error previewing voice: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+def _render_to(generation: VideoGeneration, output_file: str) -> str:
+    """Pick a render path for generation, record stage timings and write the video to output_file"""
+    segmented = len(split_sentences(generation.text)) > 1
+    streaming = (not segmented and STREAMING_RENDER and DEFAULT_RENDER_MODE == 'static'
+                 and not speech_cache.lookup(speech_cache_key(generation.text, generation.voice)))
+    if segmented:
+        # Sentences are synthesized and encoded in parallel, then concatenated
+        started = time.perf_counter()
+        video_path = create_segmented_video(
+            generation.avatar_url, generation.text, generation.voice,
+            generation.profile, DEFAULT_RENDER_MODE, output_file=output_file
+        )
+        generation.encode_seconds = time.perf_counter() - started
+        logger.debug(f"Segmented video created successfully: {video_path}")
+    elif streaming:
+        # TTS and encoding overlap, so only the combined time is meaningful
+        started = time.perf_counter()
+        video_path, audio_path = create_video_streaming(
+            generation.avatar_url, generation.text, generation.voice, generation.profile,
+            output_file=output_file
+        )
+        generation.encode_seconds = time.perf_counter() - started
+        logger.debug(f"Video streamed successfully: {video_path}")
+    else:
+        started = time.perf_counter()
+        audio_path = generate_speech(generation.text, generation.voice)
+        generation.tts_seconds = time.perf_counter() - started
+        logger.debug(f"Speech generated successfully: {audio_path}")
+
+        started = time.perf_counter()
+        video_path = create_video(generation.avatar_url, audio_path, generation.text,
+                                  profile=generation.profile, output_file=output_file)
+        generation.encode_seconds = time.perf_counter() - started
+        logger.debug(f"Video created successfully: {video_path}")
+    return video_path
+
+def render_generation(generation_id: int) -> bool:
+    """Render a queued generation on a render worker thread; False if another thread claimed it"""
+    with track_job() as stages:
+        # Claim the row atomically so a job queued twice is only rendered once
+        with timed('db_commit'):
+            claimed = VideoGeneration.query.filter_by(id=generation_id, status='queued').update({
+                'status': 'processing',
+                'heartbeat_at': time.time(),
+                'progress': None,
+                'attempts': db.func.coalesce(VideoGeneration.attempts, 0) + 1
+            })
+            db.session.commit()
+        if not claimed:
+            logger.debug(f"Generation {generation_id} already claimed, skipping")
+            return False
+
+        started = time.perf_counter()
+        generation = db.session.get(VideoGeneration, generation_id)
+        progress_hub.publish(generation_id, status='processing')
+        try:
+            # Each render works in its own scratch directory under a unique name,
+            # then the finished file is renamed into the store in one step
+            with track_progress(generation_id), artifact_store.scratch(generation.id) as scratch:
+                output_file = os.path.join(scratch, artifact_store.new_name(generation.id))
+                video_path = _render_to(generation, output_file)
+                with timed('store'):
+                    generation.video_path = artifact_store.add(video_path, generation.id)
+                store_timeline(generation)
+            generation.status = 'completed'
+        except Exception as e:
+            logger.error(f"Error in video generation process: {str(e)}")
+            db.session.rollback()
+            generation.status = 'failed'
+            generation.error = str(e)
+
+        # The final commit's own time reaches the histogram but not the row it writes
+        elapsed = time.perf_counter() - started
+        generation.stages = json.dumps(stages)
+        generation.completed_at = db.func.datetime('now', 'utc')
+        outcome = {column: getattr(generation, column) for column in
+                   ('status', 'video_path', 'error', 'tts_seconds', 'encode_seconds', 'stages', 'completed_at')}
+        with timed('db_commit'):
+            try:
+                db.session.commit()
+            except Exception as e:
+                logger.error(f"Error saving generation {generation_id}: {str(e)}")
+                db.session.rollback()
+                save_outcome(generation_id, outcome)
+        progress_hub.finish(generation_id, generation.status)
+        render_seconds.observe(elapsed, status=generation.status)
+        renders_total.inc(status=generation.status)
+        logger.debug(f"Database updated with {generation.status} status")
+    return True
+
+def store_timeline(generation: VideoGeneration) -> None:
+    """Cache the tracks /timeline serves while the render's speech is still cached"""
+    try:
+        with timed('timeline'):
+            get_timeline_path(generation.text, generation.voice, get_profile(generation.profile)['fps'])
+    except Exception as e:
+        # The video is done; /timeline rebuilds a missing timeline on request
+        logger.error(f"Error building timeline for generation {generation.id}: {str(e)}")
+
+def save_outcome(generation_id: int, outcome: dict) -> None:
+    """Write a finished render's row as a plain update, retrying so it isn't left 'processing'.
+
+    If every attempt fails the heartbeat stops with the job, and
+    recover_stale_generations() re-queues the row.
+    """
+    for attempt in range(OUTCOME_COMMIT_RETRIES + 1):
+        try:
+            VideoGeneration.query.filter_by(id=generation_id).update(outcome, synchronize_session=False)
+            db.session.commit()
+            return
+        except Exception as e:
+            db.session.rollback()
+            if attempt == OUTCOME_COMMIT_RETRIES:
+                raise
+            logger.warning(f"Saving generation {generation_id} failed ({str(e)}), retrying")
+            time.sleep(0.5 * 2 ** attempt)
+
+def recover_stale_generations() -> List[int]:
+    """Re-queue 'processing' rows whose worker stopped heartbeating; returns their ids.
+
+    Rows already claimed RENDER_MAX_ATTEMPTS times (a job that keeps killing
+    its worker) are failed instead.
+    """
+    stale = db.and_(
+        VideoGeneration.status == 'processing',
+        db.or_(VideoGeneration.heartbeat_at.is_(None),
+               VideoGeneration.heartbeat_at < time.time() - RENDER_STALE_SECONDS)
+    )
+    exhausted = db.func.coalesce(VideoGeneration.attempts, 0) >= RENDER_MAX_ATTEMPTS
+    failed = VideoGeneration.query.filter(stale, exhausted).update({
+        'status': 'failed',
+        'error': f'Render abandoned after {RENDER_MAX_ATTEMPTS} attempts',
+        'completed_at': db.func.datetime('now', 'utc')
+    }, synchronize_session=False)
+    stale_ids = [generation_id for (generation_id,) in db.session.query(VideoGeneration.id).filter(stale)]
+    if stale_ids:
+        VideoGeneration.query.filter(stale, VideoGeneration.id.in_(stale_ids)).update(
+            {'status': 'queued'}, synchronize_session=False
+        )
+    db.session.commit()
+    if stale_ids or failed:
+        logger.warning(f"Recovered stale renders: {len(stale_ids)} re-queued, {failed} failed")
+    return stale_ids
+
+def render_heartbeat(running: List[int]) -> None:
+    """Mark this process's jobs alive, then re-queue jobs whose worker died"""
+    if running:
+        VideoGeneration.query.filter(
+            VideoGeneration.id.in_(running), VideoGeneration.status == 'processing'
+        ).update({'heartbeat_at': time.time()}, synchronize_session=False)
+        db.session.commit()
+    recover_stale_generations()
+
+# Progress seq last saved for each job this process renders
+_saved_progress: Dict[int, int] = {}
+
+def save_progress(running: List[int]) -> None:
+    """Copy the live progress of this process's jobs to their rows, for subscribers on other workers"""
+    saved = False
+    for generation_id in running:
+        state = progress_hub.get(generation_id)
+        if state is None or _saved_progress.get(generation_id) == state['seq']:
+            continue
+        VideoGeneration.query.filter_by(id=generation_id, status='processing').update(
+            {'progress': json.dumps(state)}, synchronize_session=False
+        )
+        _saved_progress[generation_id] = state['seq']
+        saved = True
+    if saved:
+        db.session.commit()
+    for generation_id in [g for g in _saved_progress if g not in running]:
+        del _saved_progress[generation_id]
+
+def queued_generations() -> List[int]:
+    """Oldest queued ids, polled by idle render threads in every worker process"""
+    rows = db.session.query(VideoGeneration.id).filter_by(status='queued') \
+        .order_by(VideoGeneration.id).limit(RENDER_POLL_BATCH)
+    return [generation_id for (generation_id,) in rows]
+
+def queue_depth(up_to: int = None) -> int:
+    """Queued generations across all workers, optionally only those queued before up_to"""
+    query = VideoGeneration.query.filter_by(status='queued')
+    if up_to is not None:
+        query = query.filter(VideoGeneration.id <= up_to)
+    return query.count()
+
+render_queue = RenderQueue(render_generation, poll=queued_generations, heartbeat=render_heartbeat,
+                           progress=save_progress)
+
+def find_duplicate(fingerprint: str):
+    """Most recent generation with this fingerprint that is in flight or has a video on disk.
+
+    A 'processing' row only counts while its worker is heartbeating; an
+    orphaned one would otherwise capture every identical request forever.
+    Read-only, so it is safe in the middle of a batch's transaction; callers
+    touch a reused video once they have committed.
+    """
+    candidates = VideoGeneration.query.filter(
+        VideoGeneration.fingerprint == fingerprint,
+        VideoGeneration.status.in_(['queued', 'processing', 'completed'])
+    ).order_by(VideoGeneration.id.desc()).limit(5)
+    live_after = time.time() - RENDER_STALE_SECONDS
+    for generation in candidates:
+        if generation.status == 'queued':
+            return generation
+        if generation.status == 'processing':
+            if generation.heartbeat_at is not None and generation.heartbeat_at >= live_after:
+                return generation
+            continue
+        if generation.video_path and os.path.exists(generation.video_path):
+            return generation
+    return None
+
+def queue_generation(text: str, avatar_url: str, voice: str, profile: str) -> Tuple[VideoGeneration, bool]:
+    """Add a queued generation to the session, or return a matching one.
+
+    Returns ``(generation, created)``; the caller commits and submits new rows
+    to the render queue. Identical requests reuse a finished video or attach to
+    the job already rendering it. Two that arrive together both miss
+    find_duplicate; the unique index on active fingerprints rejects the second
+    insert, which then attaches to the first.
+    """
+    fingerprint = render_fingerprint(text, avatar_url, voice, profile)
+    existing = find_duplicate(fingerprint)
+    if existing is not None:
+        logger.debug(f"Request matches generation {existing.id} ({existing.status})")
+        return existing, False
+
+    generation = VideoGeneration(
+        text=text,
+        avatar_url=avatar_url,
+        voice=voice,
+        profile=profile,
+        fingerprint=fingerprint,
+        status='queued'
+    )
+    try:
+        # A savepoint, so a rejected insert doesn't discard the rest of a batch
+        with db.session.begin_nested():
+            db.session.add(generation)
+    except IntegrityError:
+        # Either an identical request just queued it, or the active row is an
+        # orphan, which recover_stale_generations() re-queues shortly
+        existing = find_duplicate(fingerprint) or VideoGeneration.query.filter(
+            VideoGeneration.fingerprint == fingerprint,
+            VideoGeneration.status.in_(['queued', 'processing'])
+        ).first()
+        if existing is None:
+            raise
+        logger.debug(f"Request raced generation {existing.id} ({existing.status})")
+        return existing, False
+    return generation, True
+
 @app.route('/generate', methods=['POST'])
 def generate():
     try:
@@ -76,61 +383,385 @@ def generate():
         text = data.get('text')
         avatar_url = data.get('avatar')
         voice = data.get('voice', 'en-US-AriaNeural')
+        profile = data.get('profile', DEFAULT_PROFILE)
 
         if not all([text, avatar_url]):
             return jsonify({'error': 'Missing required parameters'}), 400
+        try:
+            get_profile(profile)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        generation, created = queue_generation(text, avatar_url, voice, profile)
+        if not created:
+            if generation.status == 'completed':
+                artifact_store.touch(generation.video_path)
+            return jsonify({
+                'status': generation.status,
+                'job_id': generation.id,
+                'deduplicated': True,
+                'status_url': f'/jobs/{generation.id}',
+                'events_url': f'/jobs/{generation.id}/events',
+                'generation': generation.to_dict()
+            }), 200 if generation.status == 'completed' else 202
 
-        generation = VideoGeneration(
-            text=text,
-            avatar_url=avatar_url,
-            voice=voice,
-            status='processing'
-        )
-        db.session.add(generation)
         db.session.commit()
         logger.debug(f"Created video generation record with ID: {generation.id}")
 
-        try:
-            audio_path = generate_speech(text, voice)
-            logger.debug(f"Speech generated successfully: {audio_path}")
+        render_queue.start(app)
+        render_queue.submit(generation.id)
 
-            video_path = create_video(avatar_url, audio_path, text)
-            logger.debug(f"Video created successfully: {video_path}")
-
-            generation.video_path = video_path
-            generation.status = 'completed'
-            db.session.commit()
-            logger.debug("Database updated with completed status")
+        return jsonify({
+            'status': 'queued',
+            'job_id': generation.id,
+            'queue_position': queue_depth(up_to=generation.id),
+            'status_url': f'/jobs/{generation.id}',
+            'events_url': f'/jobs/{generation.id}/events',
+            'generation': generation.to_dict()
+        }), 202
 
-            cleanup_old_files()
+    except Exception as e:
+        logger.error(f"Error generating video: {str(e)}")
+        return jsonify({'error': str(e)}), 500
 
-            return jsonify({
-                'status': 'success',
-                'video_path': video_path,
-                'generation': generation.to_dict()
-            })
-        except Exception as e:
-            logger.error(f"Error in video generation process: {str(e)}")
-            generation.status = 'failed'
-            db.session.commit()
-            raise e
+@app.route('/generate/batch', methods=['POST'])
+def generate_batch():
+    """Queue many generations at once from a JSON list or an uploaded CSV/JSONL file"""
+    try:
+        if 'file' in request.files:
+            upload = request.files['file']
+            items = parse_batch_file(upload.read().decode('utf-8-sig'), upload.filename)
+            defaults = request.form
+        else:
+            data = request.json or {}
+            items = data.get('items') or []
+            defaults = data
+        items = normalize_batch_items(items, defaults)
+    except BatchError as e:
+        return jsonify({'error': str(e)}), 400
 
+    try:
+        batch = submit_batch(items)
+        return jsonify({
+            'status': 'queued',
+            'batch_id': batch.id,
+            'total': batch.total,
+            'status_url': f'/batches/{batch.id}',
+            'progress': batch_progress(batch)
+        }), 202
     except Exception as e:
-        logger.error(f"Error generating video: {str(e)}")
+        db.session.rollback()
+        logger.error(f"Error queueing batch: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+def submit_batch(items: List[dict]) -> Batch:
+    """Create a batch and queue its items; shared by /generate/batch and the batch CLI"""
+    batch = Batch(total=len(items))
+    db.session.add(batch)
+    created_count = 0
+    reused_videos = []
+    for position, item in enumerate(items):
+        generation, created = queue_generation(item['text'], item['avatar'], item['voice'], item['profile'])
+        db.session.add(BatchItem(batch=batch, position=position, generation_id=generation.id))
+        if created:
+            created_count += 1
+        elif generation.status == 'completed':
+            reused_videos.append(generation.video_path)
+    db.session.commit()
+    logger.info(f"Batch {batch.id}: {len(items)} items, {created_count} new renders")
+    for video_path in reused_videos:
+        artifact_store.touch(video_path)
+
+    # Start speech for the whole batch now so TTS round trips overlap encoding
+    prefetch_speech(items)
+    # The new rows are committed as 'queued'; idle render threads in every
+    # worker process claim them from the database
+    render_queue.start(app)
+    return batch
+
+@app.route('/batches/<int:batch_id>')
+def batch_status(batch_id):
+    batch = db.session.get(Batch, batch_id)
+    if batch is None:
+        return jsonify({'error': 'Batch not found'}), 404
+    return jsonify({
+        'batch_id': batch.id,
+        'progress': batch_progress(batch),
+        'items': batch_items(batch) if request.args.get('items') else None
+    })
+
+@app.route('/jobs/<int:job_id>')
+def job_status(job_id):
+    generation = db.session.get(VideoGeneration, job_id)
+    if generation is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_payload(generation))
+
+def job_payload(generation: VideoGeneration) -> dict:
+    return {
+        'status': generation.status,
+        'job_id': generation.id,
+        'video_path': generation.video_path,
+        'queue_depth': queue_depth(),
+        'progress': job_progress(generation),
+        'generation': generation.to_dict()
+    }
+
+def job_progress(generation: VideoGeneration) -> Optional[dict]:
+    """Live progress when this process renders the job, else the copy saved on its row"""
+    state = progress_hub.get(generation.id)
+    if state is None and generation.status == 'processing' and generation.progress:
+        state = json.loads(generation.progress)
+    return state
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/jobs/<int:job_id>/events')
+def job_events(job_id):
+    """Server-Sent Events: 'progress' while the job renders, 'status' when its row changes"""
+    if db.session.get(VideoGeneration, job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+
+    def stream():
+        opened = last_sent = time.monotonic()
+        status = saved = None
+        seq = 0
+        yield 'retry: 2000\n\n'
+        while time.monotonic() - opened < SSE_MAX_SECONDS:
+            # Live progress only exists in the process rendering the job; the
+            # row, with the progress that process saves to it every few
+            # seconds, is checked whenever none arrives and once the job is done
+            state = progress_hub.wait(job_id, seq, SSE_POLL_SECONDS) if status else None
+            if state is not None:
+                seq = state['seq']
+                last_sent = time.monotonic()
+                yield _sse('progress', state)
+            if state is None or state.get('done'):
+                db.session.expire_all()
+                generation = db.session.get(VideoGeneration, job_id)
+                payload = job_payload(generation)
+                # Return the connection to the pool between checks
+                db.session.rollback()
+                if payload['status'] != status:
+                    status = payload['status']
+                    saved = payload['progress']
+                    last_sent = time.monotonic()
+                    yield _sse('status', payload)
+                elif progress_hub.get(job_id) is None and payload['progress'] and payload['progress'] != saved:
+                    saved = payload['progress']
+                    last_sent = time.monotonic()
+                    yield _sse('progress', saved)
+                if status in ('completed', 'failed'):
+                    return
+            if time.monotonic() - last_sent >= SSE_KEEPALIVE_SECONDS:
+                last_sent = time.monotonic()
+                yield ': keepalive\n\n'
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/generations')
+def list_generations():
+    """Newest-first generation history with keyset pagination.
+
+    ``?before=<id>`` continues after the last row of the previous page; ids
+    increase with created_at, so each page is a range scan on the primary key
+    however deep the history goes. ``?status=`` filters by job status.
+    """
+    try:
+        limit = min(int(request.args.get('limit', GENERATIONS_PAGE_SIZE)), GENERATIONS_MAX_PAGE_SIZE)
+        before = request.args.get('before', type=int)
+    except ValueError:
+        return jsonify({'error': 'Invalid pagination parameters'}), 400
+    if limit < 1:
+        return jsonify({'error': 'Invalid pagination parameters'}), 400
+
+    query = VideoGeneration.query
+    status = request.args.get('status')
+    if status:
+        query = query.filter(VideoGeneration.status == status)
+    if before is not None:
+        query = query.filter(VideoGeneration.id < before)
+    # One extra row tells us whether another page exists
+    rows = query.order_by(VideoGeneration.id.desc()).limit(limit + 1).all()
+
+    page = rows[:limit]
+    next_before = page[-1].id if len(rows) > limit else None
+    return jsonify({
+        'generations': [generation.to_dict(include_text=False) for generation in page],
+        'next_before': next_before,
+        'next_url': f'/generations?before={next_before}&limit={limit}' + (f'&status={status}' if status else '')
+                    if next_before is not None else None
+    })
+
+registry.gauge('video_render_queue_depth', 'Render jobs waiting for a worker',
+               lambda: [({}, queue_depth())])
+registry.gauge('video_render_active', 'Render jobs in progress in this process',
+               lambda: [({}, render_queue.active())])
+registry.gauge('video_artifact_bytes', 'Bytes of rendered videos kept in the artifact store',
+               lambda: [({}, artifact_store.stats()['bytes'])])
+cache_gauges(lambda: {
+    'tts': speech_cache.stats(),
+    'tts_metadata': speech_metadata.stats(),
+    'avatar_svg': avatar_store.svgs.stats(),
+    'avatar_png': avatar_store.rasters.stats(),
+    'segments': segment_cache.stats(),
+    'timeline': timeline_cache.stats()
+})
+
+@app.route('/timeline/<int:generation_id>')
+def timeline(generation_id):
+    """Lip sync and motion tracks of a generation as a binary blob (layout in timeline.py)"""
+    generation = db.session.get(VideoGeneration, generation_id)
+    if generation is None:
+        return jsonify({'error': 'Generation not found'}), 404
+    # Built by the render's timeline stage; never on the request thread
+    fps = get_profile(generation.profile)['fps']
+    path = lookup_timeline(generation.text, generation.voice, fps)
+    if path is None:
+        if generation.status == 'failed':
+            return jsonify({'error': 'Generation failed', 'status': generation.status}), 409
+        if generation.status == 'completed':
+            build_timeline_async(generation.text, generation.voice, fps)
+        response = jsonify({'status': generation.status, 'status_url': f'/jobs/{generation.id}'})
+        response.status_code = 202
+        response.headers['Retry-After'] = '2'
+        return response
+    path = os.path.abspath(path)
+
+    # The file is named by its content key; its mtime moves with every cache hit
+    etag = os.path.basename(path).split('.')[0]
+    # Stored compressed; the rare client without gzip gets it inflated
+    if request.accept_encodings['gzip']:
+        response = send_file(path, mimetype='application/octet-stream', etag=f'{etag}-gzip',
+                             max_age=DOWNLOAD_MAX_AGE)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        with open(path, 'rb') as f:
+            response = Response(gzip.decompress(f.read()), mimetype='application/octet-stream')
+        response.set_etag(etag)
+        response.cache_control.max_age = DOWNLOAD_MAX_AGE
+        response.make_conditional(request)
+    response.vary.add('Accept-Encoding')
+    return response
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics for this worker process"""
+    return Response(registry.expose(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/download/<path:filename>')
 def download(filename):
+    """Serve a file from output/ with Range, ETag and Last-Modified support.
+
+    ``?inline=1`` serves it for in-page playback instead of as an attachment.
+    """
+    inline = request.args.get('inline', '').lower() in ('1', 'true', 'yes')
+    immutable = filename.startswith('cache/')
+    accel = DOWNLOAD_OFFLOAD == 'accel'
     try:
-        return send_file(
-            f'output/{filename}',
-            as_attachment=True,
-            download_name=filename
+        # send_from_directory rejects paths escaping output/ and handles
+        # Range requests and If-None-Match / If-Modified-Since (206 / 304);
+        # behind X-Accel-Redirect nginx answers those itself
+        response = send_from_directory(
+            OUTPUT_DIR,
+            filename,
+            as_attachment=not inline,
+            download_name=os.path.basename(filename),
+            conditional=not accel,
+            etag=True,
+            max_age=IMMUTABLE_MAX_AGE if immutable else DOWNLOAD_MAX_AGE
         )
     except Exception as e:
         logger.error(f"Error downloading file: {str(e)}")
         return jsonify({'error': 'File not found'}), 404
 
-# Create database tables
-with app.app_context():
-    db.create_all()
+    if immutable:
+        response.cache_control.immutable = True
+    else:
+        artifact_store.touch(os.path.join('output', filename))
+    if accel:
+        # nginx streams the file from the internal location; drop our body
+        response.close()
+        response.response = []
+        response.headers.pop('Content-Length', None)
+        response.headers['X-Accel-Redirect'] = f"{DOWNLOAD_ACCEL_PREFIX.rstrip('/')}/{filename}"
+    return response
+
+_started_pid = None
+_start_lock = threading.Lock()
+
+def start_background(flask_app: Flask) -> None:
+    """Start this process's background work: avatar validation, artifact eviction and left-over jobs.
+
+    Threads don't survive fork, so this runs once per worker process (from
+    gunicorn's post_fork hook or on the first request), never in a
+    preloading master.
+    """
+    global _started_pid
+    with _start_lock:
+        if _started_pid == os.getpid():
+            return
+        _started_pid = os.getpid()
+
+    # Start validating avatars in the background so the first page load is served from memory
+    avatar_pool.refill_async()
+
+    # Expired and over-budget videos are removed in the background, never on a request
+    artifact_store.start(flask_app)
+
+    # Re-queue renders a previous process died in the middle of; the render
+    # threads poll queued rows, and the atomic claim in render_generation keeps
+    # several workers from rendering the same row
+    with flask_app.app_context():
+        recover_stale_generations()
+    # Started even when idle: its heartbeat also recovers jobs orphaned later
+    render_queue.start(flask_app)
+
+@app.before_request
+def ensure_background():
+    if _started_pid != os.getpid():
+        start_background(app)
+
+def init_db(flask_app: Flask) -> None:
+    """Create missing tables, columns and indexes"""
+    with flask_app.app_context():
+        db.create_all()
+        upgrade_schema()
+        # Don't hand open connections to forked workers
+        db.engine.dispose()
+
+def warm(flask_app: Flask) -> None:
+    """Load what every worker needs before gunicorn forks, so it's imported once and shared copy-on-write"""
+    started = time.perf_counter()
+    # Render and network stacks the request path otherwise imports lazily
+    import numpy  # noqa: F401
+    import edge_tts  # noqa: F401
+    import requests  # noqa: F401
+    import lip_sync  # noqa: F401
+    import animation_engine  # noqa: F401
+    import frame_renderer  # noqa: F401
+    try:
+        import cairosvg  # noqa: F401
+    except OSError as e:
+        logger.warning(f"cairosvg unavailable at startup: {str(e)}")
+    # Compile templates (including the voice list) once
+    flask_app.jinja_env.get_template('index.html')
+    logger.info(f"Preloaded shared modules in {time.perf_counter() - started:.2f}s")
+
+def init_app(preload: bool = False) -> Flask:
+    """Prepare this module's app for serving and return it.
+
+    Not a factory: routes, config and the render queue are built at import,
+    so every call returns the same app. This creates or upgrades the
+    database. With ``preload`` (gunicorn ``--preload``) heavy modules are
+    loaded in the master and background threads are left for each forked
+    worker to start; otherwise they start right away in this process.
+    """
+    init_db(app)
+    if preload:
+        warm(app)
+    else:
+        start_background(app)
+    return app
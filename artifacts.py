@@ -0,0 +1,243 @@
+import os
+import glob
+import fcntl
+import time
+import uuid
+import shutil
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+from cache import content_key
+from metrics import record_bytes, timed
+from models import db, Artifact, VideoGeneration
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_ROOT = os.path.join('output', 'videos')
+SCRATCH_ROOT = os.path.join('output', 'scratch')
+ARTIFACT_MAX_BYTES = int(os.environ.get('ARTIFACT_MAX_BYTES', 5 * 1024 * 1024 * 1024))
+ARTIFACT_MAX_AGE_HOURS = float(os.environ.get('ARTIFACT_MAX_AGE_HOURS', 24))
+ARTIFACT_EVICT_INTERVAL = float(os.environ.get('ARTIFACT_EVICT_INTERVAL', 300))
+# An artifact's last access is written at most once per this many seconds per
+# process; LRU order only needs to be accurate to well under the max age
+ARTIFACT_TOUCH_INTERVAL = float(os.environ.get('ARTIFACT_TOUCH_INTERVAL', 600))
+# Held by the one process whose thread evicts; the others keep trying in case it exits
+EVICTOR_LOCK_PATH = os.path.join('output', '.artifact-evictor.lock')
+
+# Files written to output/ before the store existed; adopted on first sweep
+_LEGACY_PATTERNS = ['output/*.mp4', 'output/*.mp3']
+
+
+class ArtifactStore:
+    """Rendered videos in sharded directories, indexed in the ``artifacts`` table.
+
+    The index records size, last access and the owning VideoGeneration, so
+    eviction is a couple of indexed queries instead of a directory walk. It
+    runs on a background thread in a single process, chosen by a file lock;
+    the request path only inserts or (at most every ARTIFACT_TOUCH_INTERVAL)
+    touches a row.
+    """
+
+    def __init__(self, root: str = ARTIFACT_ROOT, max_bytes: int = ARTIFACT_MAX_BYTES,
+                 max_age_seconds: float = ARTIFACT_MAX_AGE_HOURS * 3600,
+                 interval: float = ARTIFACT_EVICT_INTERVAL,
+                 touch_interval: float = ARTIFACT_TOUCH_INTERVAL):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.interval = interval
+        self.touch_interval = touch_interval
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._touched: Dict[str, float] = {}  # path -> when this process last wrote its access
+
+    @staticmethod
+    def new_name(generation_id: Optional[int] = None, suffix: str = '.mp4') -> str:
+        """Unique artifact filename, prefixed with the owning generation's id"""
+        prefix = f"video_{generation_id}_" if generation_id is not None else "video_"
+        return f"{prefix}{uuid.uuid4().hex}{suffix}"
+
+    @contextmanager
+    def scratch(self, generation_id: Optional[int] = None) -> Iterator[str]:
+        """Private working directory for one render, removed when the render ends.
+
+        It lives under output/ so finished files reach the store with a
+        same-filesystem (atomic) rename.
+        """
+        path = os.path.join(SCRATCH_ROOT, f"job_{generation_id}_{uuid.uuid4().hex}")
+        os.makedirs(path)
+        try:
+            yield path
+        finally:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def sweep_scratch(self, max_age_seconds: float = 24 * 3600) -> int:
+        """Remove scratch directories abandoned by a crashed process"""
+        if not os.path.isdir(SCRATCH_ROOT):
+            return 0
+        cutoff = time.time() - max_age_seconds
+        removed = 0
+        for entry in os.scandir(SCRATCH_ROOT):
+            if entry.is_dir() and entry.stat().st_mtime < cutoff:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                removed += 1
+        return removed
+
+    def path_for(self, filename: str) -> str:
+        """Sharded location for filename, so no directory grows without bound"""
+        return os.path.join(self.root, content_key(filename)[:2], filename)
+
+    def add(self, path: str, generation_id: Optional[int] = None) -> str:
+        """Move a finished file into the store and index it; returns the new path"""
+        final_path = self.path_for(os.path.basename(path))
+        if os.path.abspath(path) != os.path.abspath(final_path):
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(path, final_path)
+        size = os.path.getsize(final_path)
+        record_bytes('video', size)
+        db.session.add(Artifact(
+            path=final_path,
+            size=size,
+            generation_id=generation_id,
+            last_accessed=time.time()
+        ))
+        db.session.commit()
+        return final_path
+
+    def touch(self, path: str) -> None:
+        """Record an access for LRU ordering; a no-op for files the store doesn't own.
+
+        Skipped when this process recorded the same file within
+        touch_interval, so Range requests and revalidations of a video being
+        played don't each write to the database.
+        """
+        path = os.path.normpath(path)
+        now = time.time()
+        with self._lock:
+            if now - self._touched.get(path, 0.0) < self.touch_interval:
+                return
+            self._touched[path] = now
+            if len(self._touched) > 10000:
+                self._touched = {p: t for p, t in self._touched.items() if now - t < self.touch_interval}
+        try:
+            Artifact.query.filter(
+                Artifact.path == path, Artifact.last_accessed < now - self.touch_interval
+            ).update({'last_accessed': now})
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error recording artifact access: {str(e)}")
+
+    def stats(self) -> dict:
+        count, total = db.session.query(db.func.count(Artifact.id), db.func.sum(Artifact.size)).one()
+        return {'entries': count, 'bytes': total or 0, 'max_bytes': self.max_bytes}
+
+    def evict(self) -> int:
+        """Remove expired artifacts, then least recently used ones until under budget"""
+        cutoff = time.time() - self.max_age_seconds
+        victims = Artifact.query.filter(Artifact.last_accessed < cutoff).all()
+
+        total = db.session.query(db.func.sum(Artifact.size)).scalar() or 0
+        total -= sum(artifact.size for artifact in victims)
+        if total > self.max_bytes:
+            expired = {artifact.id for artifact in victims}
+            for artifact in Artifact.query.order_by(Artifact.last_accessed).yield_per(100):
+                if total <= self.max_bytes:
+                    break
+                if artifact.id in expired:
+                    continue
+                victims.append(artifact)
+                total -= artifact.size
+
+        for artifact in victims:
+            try:
+                os.remove(artifact.path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error(f"Error removing artifact {artifact.path}: {str(e)}")
+                continue
+            if artifact.generation_id is not None:
+                VideoGeneration.query.filter_by(id=artifact.generation_id, video_path=artifact.path).update(
+                    {'video_path': None}
+                )
+            db.session.delete(artifact)
+            logger.debug(f"Evicted artifact: {artifact.path}")
+        db.session.commit()
+        return len(victims)
+
+    def adopt_legacy(self) -> int:
+        """Index files left directly in output/ so they age out like any other artifact"""
+        known = {path for (path,) in db.session.query(Artifact.path)}
+        adopted = 0
+        for pattern in _LEGACY_PATTERNS:
+            for path in glob.glob(pattern):
+                path = os.path.normpath(path)
+                if path in known:
+                    continue
+                stat = os.stat(path)
+                db.session.add(Artifact(path=path, size=stat.st_size, last_accessed=stat.st_mtime))
+                adopted += 1
+        db.session.commit()
+        return adopted
+
+    def start(self, app) -> None:
+        """Start the background eviction thread (idempotent)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(app,), name='artifact-evictor', daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _acquire_evictor_lock(self):
+        """Open file holding the evictor lock, or None while another process has it"""
+        os.makedirs(os.path.dirname(EVICTOR_LOCK_PATH), exist_ok=True)
+        lock_file = open(EVICTOR_LOCK_PATH, 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    def _run(self, app) -> None:
+        # Every worker starts this thread, but only the lock holder evicts; two
+        # evictors would race on the same rows. The lock is released when its
+        # process exits, and a waiting thread takes over on its next pass.
+        lock_file = None
+        while lock_file is None:
+            lock_file = self._acquire_evictor_lock()
+            if lock_file is None and self._stop.wait(self.interval):
+                return
+        logger.info(f"Artifact evictor running in process {os.getpid()}")
+
+        with app.app_context():
+            try:
+                self.adopt_legacy()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Error indexing legacy outputs: {str(e)}")
+            while True:
+                try:
+                    with timed('cleanup'):
+                        evicted = self.evict()
+                        self.sweep_scratch()
+                    if evicted:
+                        logger.info(f"Evicted {evicted} artifacts")
+                except Exception as e:
+                    db.session.rollback()
+                    logger.error(f"Error evicting artifacts: {str(e)}")
+                finally:
+                    db.session.remove()
+                if self._stop.wait(self.interval):
+                    lock_file.close()
+                    return
+
+
+artifact_store = ArtifactStore()
@@ -0,0 +1,172 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+from cache import DiskCache, content_key
+from metrics import timed
+
+if TYPE_CHECKING:
+    import requests
+
+logger = logging.getLogger(__name__)
+
+# How long a downloaded SVG is trusted before revalidating with the server
+AVATAR_TTL_SECONDS = float(os.environ.get('AVATAR_TTL_SECONDS', 24 * 3600))
+AVATAR_FETCH_TIMEOUT = float(os.environ.get('AVATAR_FETCH_TIMEOUT', 10))
+AVATAR_CACHE_MAX_BYTES = int(os.environ.get('AVATAR_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+# Number of rendered rasters kept in memory
+AVATAR_MEMORY_ITEMS = int(os.environ.get('AVATAR_MEMORY_ITEMS', 64))
+
+_MAX_AGE = 30 * 24 * 3600
+_CACHE_ROOT = os.path.join('output', 'cache', 'avatars')
+
+_session: Optional["requests.Session"] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> "requests.Session":
+    """Shared keep-alive HTTP session for avatar downloads"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32, max_retries=2)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+class AvatarStore:
+    """Downloads avatar SVGs and caches them, and their rasterizations, on disk and in memory.
+
+    SVGs are keyed by URL and revalidated with ``If-None-Match`` once their TTL
+    expires. Rasters are keyed by the SVG content hash and output size, so a
+    changed upstream SVG never serves a stale PNG.
+    """
+
+    def __init__(self, root: str = _CACHE_ROOT, ttl: float = AVATAR_TTL_SECONDS,
+                 memory_items: int = AVATAR_MEMORY_ITEMS):
+        self.ttl = ttl
+        self.svgs = DiskCache(os.path.join(root, 'svg'), '.svg', AVATAR_CACHE_MAX_BYTES // 4, _MAX_AGE)
+        self.meta = DiskCache(os.path.join(root, 'svg'), '.json', AVATAR_CACHE_MAX_BYTES // 16, _MAX_AGE)
+        self.rasters = DiskCache(os.path.join(root, 'png'), '.png', AVATAR_CACHE_MAX_BYTES, _MAX_AGE)
+        self.memory_items = memory_items
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_lock = threading.Lock()
+
+    def get_svg(self, url: str) -> Tuple[bytes, str]:
+        """Return ``(svg_bytes, sha256)`` for url, downloading or revalidating as needed"""
+        key = content_key('avatar-svg', url)
+        meta = self._read_meta(key)
+        svg_path = self.svgs.lookup(key)
+
+        if meta and svg_path and time.time() - meta['fetched_at'] < self.ttl:
+            with open(svg_path, 'rb') as f:
+                return f.read(), meta['sha256']
+
+        headers = {}
+        if meta and svg_path and meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+
+        logger.debug(f"Downloading SVG from: {url}")
+        with timed('avatar_download'):
+            response = get_session().get(url, headers=headers, timeout=AVATAR_FETCH_TIMEOUT)
+        if response.status_code == 304 and svg_path:
+            logger.debug(f"Avatar not modified: {url}")
+            meta['fetched_at'] = time.time()
+            self._write_meta(key, meta)
+            with open(svg_path, 'rb') as f:
+                return f.read(), meta['sha256']
+
+        response.raise_for_status()
+        svg_content = response.content
+        digest = hashlib.sha256(svg_content).hexdigest()
+
+        temp_path = self.svgs.temp_path(key)
+        with open(temp_path, 'wb') as f:
+            f.write(svg_content)
+        self.svgs.commit(key, temp_path)
+        self._write_meta(key, {
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'sha256': digest,
+            'fetched_at': time.time()
+        })
+        return svg_content, digest
+
+    def get_png_path(self, url: str, width: int, height: int) -> str:
+        """Path of the avatar rasterized at width x height, rendering it on a miss"""
+        svg_content, digest = self.get_svg(url)
+        key = content_key('avatar-png', digest, width, height)
+        cached = self.rasters.lookup(key)
+        if cached:
+            return cached
+
+        future, owner = self.rasters.claim(key)
+        if not owner:
+            return future.result()
+
+        try:
+            import cairosvg  # loads the cairo library; only needed on a raster miss
+            temp_path = self.rasters.temp_path(key)
+            logger.debug(f"Converting SVG to PNG: {key}")
+            with timed('rasterize'):
+                cairosvg.svg2png(bytestring=svg_content, write_to=temp_path,
+                                 output_width=width, output_height=height)
+            if not os.path.exists(temp_path):
+                raise Exception("Failed to create PNG from SVG")
+            png_path = self.rasters.commit(key, temp_path)
+        except Exception as e:
+            self.rasters.fail(key, e)
+            raise
+        self.rasters.resolve(key, png_path)
+        return png_path
+
+    def get_png(self, url: str, width: int, height: int) -> bytes:
+        """Rasterized avatar bytes, served from the in-memory LRU when hot"""
+        memory_key = f"{url}|{width}x{height}"
+        with self._memory_lock:
+            data = self._memory.get(memory_key)
+            if data is not None:
+                self._memory.move_to_end(memory_key)
+                return data
+
+        with open(self.get_png_path(url, width, height), 'rb') as f:
+            data = f.read()
+
+        with self._memory_lock:
+            self._memory[memory_key] = data
+            self._memory.move_to_end(memory_key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+        return data
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {'svg': self.svgs.stats(), 'png': self.rasters.stats()}
+
+    def _read_meta(self, key: str) -> Optional[dict]:
+        path = self.meta.lookup(key)
+        if not path:
+            return None
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_meta(self, key: str, meta: dict) -> None:
+        temp_path = self.meta.temp_path(key)
+        with open(temp_path, 'w') as f:
+            json.dump(meta, f)
+        self.meta.commit(key, temp_path)
+
+
+avatar_store = AvatarStore()
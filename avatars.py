@@ -1,7 +1,11 @@
+import os
 import random
 import logging
-import requests
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
 from typing import List
+from avatar_store import get_session
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -10,30 +14,87 @@ logging.basicConfig(level=logging.DEBUG)
 # Available DiceBear styles (removed unavailable styles)
 AVATAR_STYLES = ['avataaars', 'bottts']
 
-def get_random_avatars(count: int = 20) -> List[str]:
-    """Generate a list of random avatar URLs using DiceBear API."""
-    avatars = []
+# Number of validated avatar URLs kept ready in memory
+AVATAR_POOL_SIZE = int(os.environ.get('AVATAR_POOL_SIZE', 60))
+# Overall time budget for one validation batch
+AVATAR_VALIDATE_DEADLINE = float(os.environ.get('AVATAR_VALIDATE_DEADLINE', 8))
+AVATAR_VALIDATE_WORKERS = 8
+
+def random_avatar_url() -> str:
+    style = random.choice(AVATAR_STYLES)
+    seed = random.randint(1, 1000000)
+    return f"https://api.dicebear.com/7.x/{style}/svg?seed={seed}"
+
+def _is_valid_avatar(url: str) -> bool:
+    import requests
+    try:
+        response = get_session().head(url, timeout=5)  # Check if the URL is valid
+        if response.status_code == 200:
+            return True
+        logger.warning(f"Invalid avatar: {url}, Status Code: {response.status_code}")
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Request failed for {url}: {str(e)}")
+    return False
+
+def validate_avatars(urls: List[str], deadline: float = AVATAR_VALIDATE_DEADLINE) -> List[str]:
+    """Check urls concurrently and return the valid ones that answered within deadline"""
+    executor = ThreadPoolExecutor(max_workers=AVATAR_VALIDATE_WORKERS)
+    futures = {executor.submit(_is_valid_avatar, url): url for url in urls}
+    done, not_done = wait(futures, timeout=deadline)
+    # Don't wait for stragglers; their results are simply dropped
+    executor.shutdown(wait=False, cancel_futures=True)
+    if not_done:
+        logger.warning(f"{len(not_done)} avatar checks missed the {deadline}s deadline")
+    return [futures[f] for f in futures if f in done and f.result()]
+
+
+class AvatarPool:
+    """Pre-validated avatar URLs served from memory and refilled in the background"""
 
-    for _ in range(count):
-        style = random.choice(AVATAR_STYLES)
-        seed = random.randint(1, 1000000)
-        url = f"https://api.dicebear.com/7.x/{style}/svg?seed={seed}"
+    def __init__(self, size: int = AVATAR_POOL_SIZE):
+        self.size = size
+        self._urls = deque()
+        self._lock = threading.Lock()
+        self._refilling = False
 
-        logger.debug(f"Generated Avatar URL: {url}")
+    def take(self, count: int) -> List[str]:
+        """Take up to count validated URLs without touching the network"""
+        with self._lock:
+            taken = [self._urls.popleft() for _ in range(min(count, len(self._urls)))]
+        self.refill_async()
+        return taken
 
+    def refill_async(self) -> None:
+        """Start a background refill unless the pool is full or one is running"""
+        with self._lock:
+            if self._refilling or len(self._urls) >= self.size:
+                return
+            self._refilling = True
+        threading.Thread(target=self._refill, name='avatar-pool-refill', daemon=True).start()
+
+    def _refill(self) -> None:
         try:
-            response = requests.head(url, timeout=5)  # Check if the URL is valid
-            if response.status_code == 200:
-                logger.debug(f"Valid avatar: {url}")
-                avatars.append(url)
-            else:
-                logger.warning(f"Invalid avatar: {url}, Status Code: {response.status_code}")
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Request failed for {url}: {str(e)}")
-
-    if not avatars:
-        logger.error("No valid avatars generated. Using fallback avatars.")
-        avatars = [f"https://api.dicebear.com/7.x/avataaars/svg?seed={i}" for i in range(count)]
+            missing = self.size - len(self._urls)
+            valid = validate_avatars([random_avatar_url() for _ in range(missing)])
+            with self._lock:
+                self._urls.extend(valid)
+            logger.debug(f"Avatar pool refilled with {len(valid)} URLs")
+        except Exception as e:
+            logger.error(f"Error refilling avatar pool: {str(e)}")
+        finally:
+            with self._lock:
+                self._refilling = False
+
+
+avatar_pool = AvatarPool()
+
+def get_random_avatars(count: int = 20) -> List[str]:
+    """Return avatar URLs from the validated pool, topping up with unchecked ones if it runs dry."""
+    avatars = avatar_pool.take(count)
+
+    if len(avatars) < count:
+        logger.debug(f"Avatar pool short by {count - len(avatars)}, using unchecked URLs")
+        avatars += [random_avatar_url() for _ in range(count - len(avatars))]
 
     logger.info(f"Final Avatar List: {avatars}")
     return avatars
@@ -0,0 +1,146 @@
+import os
+import csv
+import io
+import json
+import logging
+from datetime import datetime, timezone
+from typing import List
+from models import db, Batch, BatchItem, VideoGeneration
+from segments import split_sentences
+from tts_engine import generate_speech_async, tts_loop
+from video_processor import get_profile, DEFAULT_PROFILE, DEFAULT_RENDER_MODE, STREAMING_RENDER
+
+logger = logging.getLogger(__name__)
+
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', 1000))
+DEFAULT_VOICE = 'en-US-AriaNeural'
+
+
+class BatchError(ValueError):
+    """A batch request that can't be queued as submitted"""
+
+
+def parse_batch_file(content: str, filename: str = '') -> List[dict]:
+    """Read batch items from CSV (with a header row) or JSON Lines text"""
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return list(csv.DictReader(io.StringIO(content)))
+    if name.endswith('.json'):
+        try:
+            items = json.loads(content)
+        except ValueError as e:
+            raise BatchError(f"Invalid JSON: {str(e)}")
+        return items.get('items', []) if isinstance(items, dict) else items
+
+    items = []
+    for number, line in enumerate(content.splitlines(), 1):
+        if not line.strip():
+            continue
+        try:
+            items.append(json.loads(line))
+        except ValueError as e:
+            raise BatchError(f"Invalid JSON on line {number}: {str(e)}")
+    return items
+
+
+def normalize_batch_items(items: list, defaults=None) -> List[dict]:
+    """Fill in batch-level defaults and validate every item up front"""
+    defaults = defaults or {}
+    if not isinstance(items, list) or not items:
+        raise BatchError("Batch has no items")
+    if len(items) > BATCH_MAX_ITEMS:
+        raise BatchError(f"Batch has {len(items)} items; the limit is {BATCH_MAX_ITEMS}")
+
+    normalized = []
+    for number, item in enumerate(items, 1):
+        if not isinstance(item, dict):
+            raise BatchError(f"Item {number} is not an object")
+        text = (item.get('text') or '').strip()
+        avatar_url = item.get('avatar') or item.get('avatar_url') or defaults.get('avatar')
+        if not text or not avatar_url:
+            raise BatchError(f"Item {number} is missing text or avatar")
+        profile = item.get('profile') or defaults.get('profile') or DEFAULT_PROFILE
+        try:
+            get_profile(profile)
+        except ValueError as e:
+            raise BatchError(f"Item {number}: {str(e)}")
+        normalized.append({
+            'text': text,
+            'avatar': avatar_url,
+            'voice': item.get('voice') or defaults.get('voice') or DEFAULT_VOICE,
+            'profile': profile
+        })
+    return normalized
+
+
+def prefetch_speech(items: List[dict]) -> None:
+    """Start synthesis for every distinct script in the batch on the shared TTS loop.
+
+    Render workers then find the audio cached or join the in-flight request.
+    Skipped for streaming renders (which overlap TTS with encoding already)
+    and for long scripts, which are synthesized per sentence.
+    """
+    if STREAMING_RENDER and DEFAULT_RENDER_MODE == 'static':
+        return
+    pending = {(item['text'], item['voice']) for item in items if len(split_sentences(item['text'])) == 1}
+    for text, voice in pending:
+        future = tts_loop.submit(generate_speech_async(text, voice))
+        future.add_done_callback(_log_prefetch_error)
+    logger.debug(f"Prefetching speech for {len(pending)} scripts")
+
+
+def _log_prefetch_error(future) -> None:
+    if future.exception() is not None:
+        logger.warning(f"Speech prefetch failed: {future.exception()}")
+
+
+def batch_progress(batch: Batch) -> dict:
+    """Aggregate status counts, elapsed time and throughput for a batch"""
+    rows = db.session.query(
+        VideoGeneration.status,
+        db.func.count(BatchItem.position),
+        db.func.max(VideoGeneration.completed_at),
+        db.func.sum(VideoGeneration.encode_seconds)
+    ).join(VideoGeneration, BatchItem.generation_id == VideoGeneration.id).filter(
+        BatchItem.batch_id == batch.id
+    ).group_by(VideoGeneration.status).all()
+
+    counts = {'queued': 0, 'processing': 0, 'completed': 0, 'failed': 0}
+    last_finished = None
+    encode_seconds = 0.0
+    for status, count, finished_at, encoded in rows:
+        counts[status] = counts.get(status, 0) + count
+        if status in ('completed', 'failed') and finished_at is not None:
+            last_finished = max(last_finished, finished_at) if last_finished else finished_at
+        encode_seconds += encoded or 0.0
+
+    done = counts['completed'] + counts['failed']
+    finished = done == batch.total
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    end = last_finished if finished and last_finished else now
+    elapsed = max((end - batch.created_at).total_seconds(), 0.0) if batch.created_at else 0.0
+    return {
+        'total': batch.total,
+        **counts,
+        'done': done,
+        'finished': finished,
+        'percent': round(100.0 * done / batch.total, 1) if batch.total else 100.0,
+        'elapsed_seconds': round(elapsed, 1),
+        'videos_per_minute': round(60.0 * counts['completed'] / elapsed, 2) if elapsed > 0 else None,
+        'encode_seconds': round(encode_seconds, 1)
+    }
+
+
+def batch_items(batch: Batch) -> List[dict]:
+    """Per-item job status in submission order"""
+    rows = db.session.query(BatchItem.position, VideoGeneration).join(
+        VideoGeneration, BatchItem.generation_id == VideoGeneration.id
+    ).filter(BatchItem.batch_id == batch.id).order_by(BatchItem.position).all()
+    return [{
+        'position': position,
+        'job_id': generation.id,
+        'status': generation.status,
+        'video_path': generation.video_path,
+        'video_url': generation.video_url,
+        'error': generation.error
+    } for position, generation in rows]
@@ -0,0 +1,80 @@
+"""Compare the streaming and librosa lip sync decoders.
+
+Each decoder runs in its own child process so peak RSS is measured
+independently:
+
+    python benchmarks/bench_lip_sync.py output/speech.mp3 --repeat 3
+"""
+import os
+import sys
+import json
+import glob
+import time
+import argparse
+import resource
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_child(decoder: str, audio_path: str, repeat: int) -> None:
+    sys.path.insert(0, ROOT)
+    from lip_sync import LipSync
+
+    import_start = time.perf_counter()
+    lip_sync = LipSync(decoder=decoder, debug_plot_dir=None)
+    if decoder == 'librosa':
+        import librosa  # noqa: F401  (count the import the old path always paid)
+    import_seconds = time.perf_counter() - import_start
+
+    timings = []
+    frames = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        frames = len(lip_sync.analyze_audio(audio_path))
+        timings.append(time.perf_counter() - start)
+
+    print(json.dumps({
+        'decoder': decoder,
+        'frames': frames,
+        'import_s': import_seconds,
+        'best_s': min(timings),
+        'mean_s': sum(timings) / len(timings),
+        # ru_maxrss is KiB on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    }))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('audio', nargs='?', help='audio file (defaults to the newest MP3 in output/)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--decoders', default='librosa,stream')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    audio = args.audio
+    if not audio:
+        candidates = glob.glob(os.path.join(ROOT, 'output', '**', '*.mp3'), recursive=True)
+        if not candidates:
+            parser.error('no audio file given and none found in output/')
+        audio = max(candidates, key=os.path.getmtime)
+
+    if args.child:
+        run_child(args.child, audio, args.repeat)
+        return
+
+    print(f"audio: {audio}")
+    print(f"{'decoder':<10}{'frames':>8}{'import s':>10}{'best s':>10}{'mean s':>10}{'peak MB':>10}")
+    for decoder in args.decoders.split(','):
+        output = subprocess.check_output(
+            [sys.executable, __file__, audio, '--repeat', str(args.repeat), '--child', decoder],
+            stderr=subprocess.DEVNULL
+        )
+        result = json.loads(output.decode().strip().splitlines()[-1])
+        print(f"{result['decoder']:<10}{result['frames']:>8}{result['import_s']:>10.3f}"
+              f"{result['best_s']:>10.3f}{result['mean_s']:>10.3f}{result['peak_rss_mb']:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,260 @@
+"""End-to-end pipeline benchmark with offline TTS and avatar stand-ins.
+
+Runs each stage of /generate against the fakes in benchmarks/fakes.py, in a
+scratch directory so caches start cold, and reports latency percentiles,
+throughput, CPU time and peak RSS per stage:
+
+    python benchmarks/bench_pipeline.py --jobs 20 --concurrency 4 --profile draft
+    python benchmarks/bench_pipeline.py --save-baseline      # record benchmarks/baseline.json
+    python benchmarks/bench_pipeline.py                      # compare against it
+
+Stages: tts (generate_speech), lip_sync (LipSync.analyze_speech; --lipsync audio
+forces the RMS envelope over word-boundary visemes), animation
+(AnimationEngine.generate_animation), video (create_video) and routes
+(POST /generate through completion on the render queue).
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import resource
+import tempfile
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+STAGES = ['tts', 'lip_sync', 'animation', 'video', 'routes']
+VOICE = 'en-US-AriaNeural'
+SENTENCE_WORDS = 12
+
+
+def percentiles(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+    return {
+        'p50': pick(0.5), 'p90': pick(0.9), 'p99': pick(0.99),
+        'max': ordered[-1], 'mean': statistics.fmean(ordered)
+    }
+
+
+def _usage() -> Dict[str, float]:
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {
+        # ffmpeg runs as a child process, so its CPU counts too
+        'cpu': own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime,
+        # ru_maxrss is KiB on Linux
+        'rss_mb': max(own.ru_maxrss, children.ru_maxrss) / 1024
+    }
+
+
+def run_stage(name: str, job: Callable[[int], None], jobs: int, concurrency: int) -> dict:
+    """Run job(0..jobs-1) on concurrency threads and summarize the timings"""
+    def timed(index: int) -> float:
+        started = time.perf_counter()
+        job(index)
+        return time.perf_counter() - started
+
+    before = _usage()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(timed, range(jobs)))
+    wall = time.perf_counter() - started
+    after = _usage()
+    return {
+        'stage': name,
+        'jobs': jobs,
+        'concurrency': concurrency,
+        'wall_s': wall,
+        'jobs_per_min': 60.0 * jobs / wall if wall else 0.0,
+        'cpu_s': after['cpu'] - before['cpu'],
+        'peak_rss_mb': after['rss_mb'],
+        **percentiles(latencies)
+    }
+
+
+def script(index: int, seconds: float, nonce: str) -> str:
+    """A distinct script of roughly the requested spoken length.
+
+    Written as sentences of SENTENCE_WORDS words, so scripts past
+    SEGMENT_MAX_CHARS take the segmented render path like real ones do.
+    """
+    from fakes import SECONDS_PER_WORD
+    words = max(1, int(seconds / SECONDS_PER_WORD))
+    base = f'Benchmark {nonce} job {index} says'.split()
+    tokens = (base + ['hello', 'world', 'again'] * words)[:max(words, len(base))]
+    sentences = [' '.join(tokens[i:i + SENTENCE_WORDS]) for i in range(0, len(tokens), SENTENCE_WORDS)]
+    return '. '.join(sentences) + '.'
+
+
+def pipeline_breakdown() -> Dict[str, Dict[str, float]]:
+    """Mean time per instrumented pipeline stage, from the metrics registry"""
+    from metrics import stage_seconds
+    breakdown = {}
+    for key, (count, total) in stage_seconds.totals().items():
+        stage = dict(key)['stage']
+        breakdown[stage] = {'count': count, 'mean_s': total / count if count else 0.0}
+    return breakdown
+
+
+def run(args) -> dict:
+    sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+    sys.path.insert(0, ROOT)
+
+    # Everything the app writes (caches, videos, database) goes to a scratch dir
+    workdir = tempfile.mkdtemp(prefix='bench-pipeline-')
+    os.chdir(workdir)
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ['AVATAR_POOL_SIZE'] = '0'
+    os.environ['RENDER_WORKERS'] = str(args.concurrency)
+    if args.mode:
+        os.environ['VIDEO_RENDER_MODE'] = args.mode
+    if args.lipsync:
+        os.environ['LIPSYNC_SOURCE'] = args.lipsync
+
+    from fakes import AvatarServer, install_fake_tts
+    install_fake_tts(args.tts_latency, args.tts_realtime)
+    # Scripts longer than SEGMENT_MAX_CHARS render in spawned segment workers,
+    # which don't inherit the patch; create their pool with the fake installed
+    from segments import get_pool
+    get_pool(install_fake_tts, (args.tts_latency, args.tts_realtime))
+    import logging
+    logging.disable(logging.INFO)
+
+    nonce = uuid.uuid4().hex[:8]
+    results = {}
+    with AvatarServer(args.avatar_latency) as avatars:
+        from tts_engine import generate_speech
+        audio = {}
+
+        def tts_job(i: int) -> None:
+            audio[i] = generate_speech(script(i, args.seconds, nonce), VOICE)
+
+        def lip_sync_job(i: int) -> None:
+            from lip_sync import LipSync
+            from tts_engine import get_speech_metadata
+            metadata = get_speech_metadata(audio[i]) or {}
+            LipSync(debug_plot_dir=None).analyze_speech(audio[i], metadata.get('boundaries'))
+
+        def animation_job(i: int) -> None:
+            from animation_engine import AnimationEngine
+            from video_processor import get_profile
+            AnimationEngine(fps=get_profile(args.profile)['fps']).generate_animation(args.seconds, 'talk')
+
+        def video_job(i: int) -> None:
+            from video_processor import create_video
+            create_video(avatars.url(i), audio[i], '', profile=args.profile)
+
+        def routes_job(i: int) -> None:
+            client = web_app.test_client()
+            response = client.post('/generate', json={
+                'text': script(i, args.seconds, nonce + 'r'), 'avatar': avatars.url(i), 'profile': args.profile
+            })
+            status_url = response.get_json()['status_url']
+            while True:
+                status = client.get(status_url).get_json()['status']
+                if status in ('completed', 'failed'):
+                    if status == 'failed':
+                        raise RuntimeError(client.get(status_url).get_json()['generation']['error'])
+                    return
+                time.sleep(0.05)
+
+        if 'routes' in args.stages.split(','):
+            from app import init_app
+            web_app = init_app()
+
+        jobs = {'tts': tts_job, 'lip_sync': lip_sync_job, 'animation': animation_job,
+                'video': video_job, 'routes': routes_job}
+        selected = args.stages.split(',')
+        if any(stage in selected for stage in ('lip_sync', 'video')) and 'tts' not in selected:
+            selected.insert(0, 'tts')  # later stages need the audio
+        for stage in STAGES:
+            if stage in selected:
+                results[stage] = run_stage(stage, jobs[stage], args.jobs, args.concurrency)
+                print_row(results[stage])
+
+    return {
+        'settings': {key: getattr(args, key) for key in ('jobs', 'concurrency', 'seconds', 'profile', 'mode', 'lipsync')},
+        'stages': results,
+        'pipeline': pipeline_breakdown()
+    }
+
+
+def print_header() -> None:
+    print(f"{'stage':<11}{'jobs':>6}{'p50 s':>9}{'p90 s':>9}{'p99 s':>9}{'max s':>9}"
+          f"{'jobs/min':>10}{'cpu s':>9}{'peak MB':>9}")
+
+
+def print_row(result: dict) -> None:
+    print(f"{result['stage']:<11}{result['jobs']:>6}{result['p50']:>9.3f}{result['p90']:>9.3f}"
+          f"{result['p99']:>9.3f}{result['max']:>9.3f}{result['jobs_per_min']:>10.1f}"
+          f"{result['cpu_s']:>9.2f}{result['peak_rss_mb']:>9.1f}")
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Stages whose median latency or throughput regressed beyond tolerance"""
+    regressions = []
+    if baseline.get('settings') != report['settings']:
+        print(f"note: baseline was recorded with {baseline.get('settings')}")
+    print(f"\n{'stage':<11}{'p50 base':>10}{'p50 now':>10}{'change':>9}{'jobs/min base':>15}{'now':>9}")
+    for stage, result in report['stages'].items():
+        previous = baseline.get('stages', {}).get(stage)
+        if not previous:
+            continue
+        change = result['p50'] / previous['p50'] - 1 if previous['p50'] else 0.0
+        print(f"{stage:<11}{previous['p50']:>10.3f}{result['p50']:>10.3f}{change:>+9.1%}"
+              f"{previous['jobs_per_min']:>15.1f}{result['jobs_per_min']:>9.1f}")
+        if change > tolerance or result['jobs_per_min'] < previous['jobs_per_min'] * (1 - tolerance):
+            regressions.append(stage)
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--jobs', type=int, default=12, help='jobs per stage')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=6.0, help='spoken length of each script')
+    parser.add_argument('--profile', default='draft')
+    parser.add_argument('--mode', choices=['animated', 'static'], help='render mode (default: VIDEO_RENDER_MODE)')
+    parser.add_argument('--lipsync', choices=['auto', 'audio'], help='lip sync source (default: LIPSYNC_SOURCE)')
+    parser.add_argument('--stages', default=','.join(STAGES))
+    parser.add_argument('--tts-latency', type=float, default=0.0, help='fake TTS time to first chunk, seconds')
+    parser.add_argument('--tts-realtime', type=float, default=0.0,
+                        help='fake TTS speed as a multiple of real time (0 = instant)')
+    parser.add_argument('--avatar-latency', type=float, default=0.0, help='fake avatar server delay, seconds')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help='write this run as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='allowed slowdown before failing')
+    parser.add_argument('--json', help='also write the full report here')
+    args = parser.parse_args()
+
+    print_header()
+    report = run(args)
+
+    print('\npipeline stage means (from metrics):')
+    for stage, values in sorted(report['pipeline'].items()):
+        print(f"  {stage:<16}{values['count']:>6}x {values['mean_s']:>8.3f}s")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nbaseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"\nregressed: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
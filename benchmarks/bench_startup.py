@@ -0,0 +1,81 @@
+"""Report worker cold-start cost: import time, slowest imports and memory.
+
+Each scenario runs in a fresh interpreter under ``python -X importtime``:
+
+    python benchmarks/bench_startup.py --top 15
+
+* ``worker``: ``import main`` as a gunicorn worker without --preload does
+  (heavy render and network modules stay unloaded until first use)
+* ``preload``: the master's ``init_app(preload=True)``, which loads them
+  once before forking so workers start with nothing left to import
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+from typing import List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    'worker': "import os; os.environ['APP_PRELOAD'] = '0'; import main",
+    'preload': "from app import init_app; init_app(preload=True)",
+}
+
+_REPORT = (
+    "; import json, resource, sys"
+    "; print('@@' + json.dumps({'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,"
+    " 'modules': len(sys.modules)}))"
+)
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int, int]]:
+    """(module, self us, cumulative us, nesting depth) per ``-X importtime`` line"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), int(own), int(cumulative), depth))
+    return rows
+
+
+def run_scenario(code: str) -> dict:
+    workdir = tempfile.mkdtemp(prefix='bench-startup-')
+    env = dict(os.environ,
+               PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])),
+               DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'startup.db')}",
+               AVATAR_POOL_SIZE='0')
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code + _REPORT],
+        cwd=workdir, env=env, capture_output=True, text=True
+    )
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr[-2000:])
+    report = json.loads(next(line[2:] for line in process.stdout.splitlines() if line.startswith('@@')))
+    imports = parse_importtime(process.stderr)
+    report['import_s'] = sum(own for _, own, _, _ in imports) / 1e6
+    report['imports'] = imports
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--top', type=int, default=10, help='slowest imports (up to two levels deep) to list')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    args = parser.parse_args()
+
+    for name in args.scenarios.split(','):
+        report = run_scenario(SCENARIOS[name])
+        print(f"{name}: {report['import_s']:.3f}s importing {report['modules']} modules, "
+              f"peak RSS {report['rss_mb']:.1f} MB")
+        top_level = [row for row in report['imports'] if row[3] <= 2]
+        for module, _, cumulative, _ in sorted(top_level, key=lambda row: -row[2])[:args.top]:
+            print(f"  {cumulative / 1e6:>8.3f}s  {module}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+"""Offline stand-ins for Edge TTS and the DiceBear avatar API.
+
+Both are deterministic, so repeated benchmark runs do the same work:
+
+* ``FakeCommunicate`` replaces ``edge_tts.Communicate`` and streams real MP3
+  audio (an amplitude-modulated tone, so lip sync has something to follow)
+  whose length is proportional to the word count, plus WordBoundary events.
+* ``AvatarServer`` serves an SVG per ``seed`` over HTTP on localhost, with
+  ETags, in place of ``api.dicebear.com``.
+"""
+import os
+import time
+import asyncio
+import hashlib
+import tempfile
+import threading
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+from urllib.parse import parse_qs, urlparse
+
+# Speaking rate of the fake voice
+SECONDS_PER_WORD = 0.35
+# Edge TTS streams 24 kHz mono MP3 at 48 kbps
+_SAMPLE_RATE = 24000
+_BITRATE = '48k'
+_TICKS_PER_SECOND = 10_000_000
+_CHUNK_BYTES = 4096
+
+_audio_dir = tempfile.mkdtemp(prefix='bench-tts-')
+_audio: Dict[float, bytes] = {}
+_audio_lock = threading.Lock()
+
+
+def fake_audio(seconds: float) -> bytes:
+    """MP3 bytes of the given length, generated once per length with ffmpeg"""
+    seconds = round(seconds, 2)
+    with _audio_lock:
+        if seconds not in _audio:
+            path = os.path.join(_audio_dir, f'{seconds}.mp3')
+            subprocess.run([
+                'ffmpeg', '-v', 'error', '-f', 'lavfi',
+                '-i', f'sine=frequency=220:sample_rate={_SAMPLE_RATE}:duration={seconds}',
+                # Syllable-rate amplitude envelope
+                '-af', "volume='0.2+0.8*abs(sin(2*PI*2.5*t))':eval=frame",
+                '-ac', '1', '-c:a', 'libmp3lame', '-b:a', _BITRATE, '-y', path
+            ], check=True)
+            with open(path, 'rb') as f:
+                _audio[seconds] = f.read()
+        return _audio[seconds]
+
+
+class FakeCommunicate:
+    """Drop-in for edge_tts.Communicate with configurable service latency.
+
+    ``first_chunk_delay`` models the connection and synthesis start;
+    ``realtime_factor`` paces the remaining chunks at that multiple of
+    playback speed (0 streams them immediately).
+    """
+
+    first_chunk_delay = 0.0
+    realtime_factor = 0.0
+
+    def __init__(self, text: str, voice: str, **settings):
+        self.words = text.split() or ['']
+        self.duration = max(len(self.words) * SECONDS_PER_WORD, 0.5)
+
+    async def stream(self):
+        data = fake_audio(self.duration)
+        if self.first_chunk_delay:
+            await asyncio.sleep(self.first_chunk_delay)
+        for index, word in enumerate(self.words):
+            yield {
+                'type': 'WordBoundary',
+                'offset': int(index * SECONDS_PER_WORD * _TICKS_PER_SECOND),
+                'duration': int(SECONDS_PER_WORD * 0.8 * _TICKS_PER_SECOND),
+                'text': word
+            }
+        chunk_seconds = self.duration * _CHUNK_BYTES / len(data)
+        for start in range(0, len(data), _CHUNK_BYTES):
+            if start and self.realtime_factor:
+                await asyncio.sleep(chunk_seconds / self.realtime_factor)
+            yield {'type': 'audio', 'data': data[start:start + _CHUNK_BYTES]}
+
+
+def install_fake_tts(first_chunk_delay: float = 0.0, realtime_factor: float = 0.0) -> None:
+    import edge_tts
+    FakeCommunicate.first_chunk_delay = first_chunk_delay
+    FakeCommunicate.realtime_factor = realtime_factor
+    edge_tts.Communicate = FakeCommunicate
+
+
+def avatar_svg(seed: str) -> bytes:
+    """A simple face whose colours and features depend on the seed"""
+    digest = hashlib.sha256(seed.encode('utf-8')).hexdigest()
+    skin, eyes, mouth = f'#{digest[0:6]}', f'#{digest[6:12]}', f'#{digest[12:18]}'
+    radius = 30 + int(digest[18:20], 16) % 15
+    return (
+        '<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 200 200" width="200" height="200">'
+        f'<rect width="200" height="200" fill="#f0f0f0"/>'
+        f'<circle cx="100" cy="100" r="{radius + 50}" fill="{skin}"/>'
+        f'<circle cx="75" cy="85" r="10" fill="{eyes}"/><circle cx="125" cy="85" r="10" fill="{eyes}"/>'
+        f'<rect x="70" y="130" width="60" height="12" rx="6" fill="{mouth}"/>'
+        '</svg>'
+    ).encode('utf-8')
+
+
+class _AvatarHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        seed = parse_qs(urlparse(self.path).query).get('seed', ['0'])[0]
+        body = avatar_svg(seed)
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/svg+xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/svg+xml')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class AvatarServer:
+    """Local DiceBear-compatible SVG server on an ephemeral port"""
+
+    def __init__(self, latency: float = 0.0):
+        handler = type('Handler', (_AvatarHandler,), {})
+        if latency:
+            original = handler.do_GET
+
+            def delayed(request):
+                time.sleep(latency)
+                original(request)
+            handler.do_GET = delayed
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name='avatar-server', daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address
+        return f'http://{host}:{port}'
+
+    def url(self, seed, style: str = 'bottts') -> str:
+        return f'{self.base_url}/7.x/{style}/svg?seed={seed}'
+
+    def __enter__(self) -> 'AvatarServer':
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,216 @@
+import os
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def content_key(*parts) -> str:
+    """Stable hash of the given parts, used as a cache key"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class DiskCache:
+    """Content-addressed file cache with LRU eviction by total size and age.
+
+    Files live at ``<root>/<key[:2]>/<key><suffix>`` and are written to a temp
+    file first and then renamed into place, so readers never see a partial
+    file. The size index is kept in memory per process for stats and for
+    deciding when to evict; eviction itself re-reads the directory, since
+    several processes share it.
+    """
+
+    def __init__(self, root: str, suffix: str, max_bytes: int, max_age_seconds: float,
+                 evict_interval: float = 60.0):
+        self.root = root
+        self.suffix = suffix
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.evict_interval = evict_interval
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self._entries: Dict[str, Tuple[int, float]] = {}  # key -> (size, last access)
+        self._total_bytes = 0
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._last_evict = 0.0
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}{self.suffix}")
+
+    def temp_path(self, key: str) -> str:
+        """Unique scratch path next to the final location, for atomic commits"""
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Keep the suffix so tools that infer a format from the extension still work
+        return f"{path[:-len(self.suffix)]}.{uuid.uuid4().hex}.tmp{self.suffix}"
+
+    def lookup(self, key: str) -> Optional[str]:
+        """Return the cached path for key, or None on a miss"""
+        self._load()
+        path = self.path_for(key)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+                self._forget(key)
+            return None
+
+        now = time.time()
+        with self._lock:
+            self.hits += 1
+            if key not in self._entries:
+                self._total_bytes += size
+            self._entries[key] = (size, now)
+        try:
+            os.utime(path, (now, now))
+        except OSError:
+            pass
+        return path
+
+    def commit(self, key: str, temp_path: str) -> str:
+        """Atomically move a finished temp file into the cache"""
+        path = self.path_for(key)
+        os.replace(temp_path, path)
+        size = os.path.getsize(path)
+        with self._lock:
+            self._forget(key)
+            self._entries[key] = (size, time.time())
+            self._total_bytes += size
+        self._maybe_evict()
+        return path
+
+    def claim(self, key: str) -> Tuple[Future, bool]:
+        """Register interest in producing key.
+
+        Returns ``(future, owner)``. The first caller becomes the owner and must
+        call :meth:`resolve` or :meth:`fail`; later callers wait on the future.
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = Future()
+            self._inflight[key] = future
+            return future, True
+
+    def resolve(self, key: str, path: str) -> None:
+        with self._lock:
+            future = self._inflight.pop(key, None)
+        if future is not None:
+            future.set_result(path)
+
+    def fail(self, key: str, error: BaseException) -> None:
+        with self._lock:
+            future = self._inflight.pop(key, None)
+        if future is not None:
+            future.set_exception(error)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._total_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+    def evict(self) -> int:
+        """Drop expired entries, then least recently used ones until under budget.
+
+        Sizes and access times come from a fresh scan of the directory, not
+        the in-memory index: other processes share the files, add their own
+        and mark the ones they read by touching their mtime.
+        """
+        now = time.time()
+        with self._lock:
+            self._last_evict = now
+        entries = self._scan()
+        total = sum(size for size, _ in entries.values())
+
+        evicted = 0
+        for key, (size, accessed) in sorted(entries.items(), key=lambda item: item[1][1]):
+            if now - accessed <= self.max_age_seconds and total <= self.max_bytes:
+                break  # everything after this is newer
+            path = self.path_for(key)
+            # Re-stat right before removing: a read since the scan makes it recent again
+            try:
+                if os.stat(path).st_mtime > accessed:
+                    continue
+                os.remove(path)
+            except OSError:
+                pass  # already evicted by another process
+            else:
+                evicted += 1
+                logger.debug(f"Evicted cache entry: {key}")
+            del entries[key]
+            total -= size
+
+        with self._lock:
+            self._entries = entries
+            self._total_bytes = total
+            self._loaded = True
+            self.evictions += evicted
+        return evicted
+
+    def _maybe_evict(self) -> None:
+        with self._lock:
+            due = (self._total_bytes > self.max_bytes
+                   or time.time() - self._last_evict > self.evict_interval)
+        if due:
+            self.evict()
+
+    def _forget(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry[0]
+
+    def _load(self) -> None:
+        """Build the in-memory index from disk on first use"""
+        if self._loaded:
+            return
+        entries = self._scan()
+        with self._lock:
+            if self._loaded:
+                return
+            self._entries = entries
+            self._total_bytes = sum(size for size, _ in entries.values())
+            self._loaded = True
+
+    def _scan(self) -> Dict[str, Tuple[int, float]]:
+        """Size and mtime (last access) of every committed file under root"""
+        entries = {}
+        os.makedirs(self.root, exist_ok=True)
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if not entry.name.endswith(self.suffix):
+                    continue
+                key = entry.name[:-len(self.suffix)]
+                if '.' in key:
+                    continue  # leftover temp file
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue  # removed since the listing
+                entries[key] = (stat.st_size, stat.st_mtime)
+        return entries
@@ -0,0 +1,87 @@
+import os
+import asyncio
+import logging
+import contextvars
+import threading
+from concurrent.futures import Future
+from typing import Any, Coroutine, Optional
+
+logger = logging.getLogger(__name__)
+
+
+async def _in_context(context: contextvars.Context, coro: Coroutine) -> Any:
+    # Tasks copy the loop thread's context; replay the submitter's values into this one
+    for var, value in context.items():
+        var.set(value)
+    return await coro
+
+
+class BackgroundLoop:
+    """A long-lived asyncio event loop running on a daemon thread.
+
+    Synchronous code (Flask views, render worker threads) hands coroutines
+    to :meth:`submit` or :meth:`run` instead of calling ``asyncio.run`` per
+    request. The loop is started lazily and restarted in a forked child,
+    since threads don't survive ``fork``.
+    """
+
+    def __init__(self, name: str = 'background-loop'):
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        if self._loop is None or self._pid != os.getpid():
+            with self._lock:
+                if self._loop is None or self._pid != os.getpid():
+                    self._start()
+        return self._loop
+
+    def _start(self) -> None:
+        loop = asyncio.new_event_loop()
+        ready = threading.Event()
+
+        def run() -> None:
+            asyncio.set_event_loop(loop)
+            loop.call_soon(ready.set)
+            loop.run_forever()
+
+        thread = threading.Thread(target=run, name=self.name, daemon=True)
+        thread.start()
+        ready.wait()
+        self._loop = loop
+        self._thread = thread
+        self._pid = os.getpid()
+        logger.debug(f"Started event loop thread {self.name} in process {self._pid}")
+
+    def submit(self, coro: Coroutine) -> Future:
+        """Schedule coro on the loop from any thread and return a concurrent Future.
+
+        The coroutine sees the caller's context variables (e.g. the metrics of
+        the job that submitted it).
+        """
+        loop = self.loop
+        if threading.current_thread() is self._thread:
+            coro.close()
+            raise RuntimeError(f"submit() called from the {self.name} thread; await the coroutine instead")
+        return asyncio.run_coroutine_threadsafe(_in_context(contextvars.copy_context(), coro), loop)
+
+    def run(self, coro: Coroutine, timeout: Optional[float] = None) -> Any:
+        """Run coro on the loop and block the calling thread for its result"""
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except TimeoutError:
+            future.cancel()
+            raise
+
+    def stop(self) -> None:
+        with self._lock:
+            if self._loop is not None and self._pid == os.getpid():
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._thread.join(5)
+            self._loop = None
+            self._thread = None
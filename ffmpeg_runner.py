@@ -0,0 +1,126 @@
+import os
+import time
+import logging
+import threading
+import subprocess
+import contextvars
+from typing import List, Optional
+from metrics import ffmpeg_killed_total
+from progress import report
+
+logger = logging.getLogger(__name__)
+
+# Kill ffmpeg after this long without progress output or input, and after this
+# long in total regardless
+FFMPEG_STALL_TIMEOUT = float(os.environ.get('FFMPEG_STALL_TIMEOUT', 60))
+FFMPEG_TIMEOUT = float(os.environ.get('FFMPEG_TIMEOUT', 1800))
+# Only the end of stderr is kept for error messages
+STDERR_TAIL_BYTES = 16 * 1024
+
+
+class FFmpegProcess:
+    """ffmpeg with ``-progress`` read line by line, a bounded stderr tail and a watchdog.
+
+    Progress blocks are published as ``report(stage, fraction)``; the fraction
+    is only known when the caller passes the output duration. A process that
+    stops reporting progress (and isn't being fed input) for
+    FFMPEG_STALL_TIMEOUT seconds, or runs past FFMPEG_TIMEOUT, is killed.
+    """
+
+    def __init__(self, cmd: List[str], stage: str = 'encode', duration: float = None,
+                 stdin: bool = False, stall_timeout: float = FFMPEG_STALL_TIMEOUT,
+                 timeout: float = FFMPEG_TIMEOUT):
+        self.stage = stage
+        self.duration = duration
+        self.stall_timeout = stall_timeout
+        self.timeout = timeout
+        self.killed: Optional[str] = None
+        self._stderr = bytearray()
+        self._fields = {}
+        self._started = self._last_activity = time.monotonic()
+        self._done = threading.Event()
+
+        self.process = subprocess.Popen(
+            [cmd[0], '-progress', 'pipe:1', '-nostats', *cmd[1:]],
+            stdin=subprocess.PIPE if stdin else subprocess.DEVNULL,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        # The progress reader reports to the job tracked by the caller's context
+        self._threads = [
+            threading.Thread(target=contextvars.copy_context().run, args=(target,),
+                             name=f'ffmpeg-{name}', daemon=True)
+            for name, target in (('progress', self._read_progress), ('stderr', self._read_stderr),
+                                 ('watchdog', self._watch))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def write(self, data: bytes) -> None:
+        self.process.stdin.write(data)
+        self._last_activity = time.monotonic()
+
+    def close_stdin(self) -> None:
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass  # ffmpeg already exited; wait() reports why
+
+    def kill(self) -> None:
+        self.process.kill()
+
+    def wait(self) -> int:
+        """Wait for ffmpeg to exit and return its exit code"""
+        returncode = self.process.wait()
+        self._done.set()
+        for thread in self._threads:
+            thread.join()
+        return returncode
+
+    def error_message(self) -> str:
+        message = self._stderr.decode(errors='replace')
+        return f"{self.killed}\n{message}" if self.killed else message
+
+    def _read_progress(self) -> None:
+        for line in iter(self.process.stdout.readline, b''):
+            self._last_activity = time.monotonic()
+            key, _, value = line.decode(errors='replace').strip().partition('=')
+            if key != 'progress':
+                self._fields[key] = value
+                continue
+            out_time = self._out_time()
+            fraction = None
+            if value == 'end':
+                fraction = 1.0
+            elif self.duration and out_time is not None:
+                fraction = min(out_time / self.duration, 1.0)
+            report(self.stage, fraction, out_time=out_time, speed=self._fields.get('speed'))
+
+    def _out_time(self) -> Optional[float]:
+        # Both keys are microseconds; out_time_ms is misnamed in ffmpeg
+        for key in ('out_time_us', 'out_time_ms'):
+            try:
+                return max(int(self._fields[key]), 0) / 1e6
+            except (KeyError, ValueError):
+                continue
+        return None
+
+    def _read_stderr(self) -> None:
+        for chunk in iter(lambda: self.process.stderr.read(4096), b''):
+            self._stderr += chunk
+            del self._stderr[:-STDERR_TAIL_BYTES]
+
+    def _watch(self) -> None:
+        while not self._done.wait(1.0) and self.process.poll() is None:
+            now = time.monotonic()
+            if now - self._last_activity > self.stall_timeout:
+                reason = 'stall'
+                self.killed = f"ffmpeg made no progress for {self.stall_timeout:.0f}s and was killed"
+            elif now - self._started > self.timeout:
+                reason = 'timeout'
+                self.killed = f"ffmpeg ran longer than {self.timeout:.0f}s and was killed"
+            else:
+                continue
+            logger.error(f"{self.killed}: {' '.join(self.process.args)}")
+            ffmpeg_killed_total.inc(reason=reason, stage=self.stage)
+            self.process.kill()
+            return
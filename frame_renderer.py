@@ -0,0 +1,177 @@
+import io
+import logging
+from typing import Iterator, List, Optional, Tuple
+import numpy as np
+from PIL import Image
+from lip_sync import LipSyncTimeline
+from animation_engine import KeyframeTrack
+from ffmpeg_runner import FFmpegProcess
+
+logger = logging.getLogger(__name__)
+
+# Mouth box per DiceBear style as fractions of the avatar size:
+# (center x, center y, half width, max half height)
+MOUTH_REGIONS = {
+    'avataaars': (0.5, 0.70, 0.10, 0.06),
+    'bottts': (0.5, 0.72, 0.14, 0.05),
+}
+DEFAULT_MOUTH_REGION = (0.5, 0.70, 0.10, 0.06)
+MOUTH_COLOR = (40, 12, 16)
+
+# Discrete mouth openings; masks are built once per level
+MOUTH_LEVELS = 16
+# Pixels of vertical head offset per unit of position.y / rotation.x
+POSITION_SCALE = 100
+NOD_SCALE = 60
+
+
+def avatar_style(avatar_url: str) -> Optional[str]:
+    """DiceBear style name from an avatar URL"""
+    parts = avatar_url.split('/')
+    for i, part in enumerate(parts[:-1]):
+        if part.endswith('.x'):
+            return parts[i + 1]
+    return None
+
+
+def decode_avatar(png_bytes: bytes, background: Tuple[int, int, int] = (0, 0, 0)) -> np.ndarray:
+    """Decode a PNG and flatten its alpha onto background, returning an RGB uint8 array"""
+    image = Image.open(io.BytesIO(png_bytes)).convert('RGBA')
+    flat = Image.new('RGBA', image.size, background + (255,))
+    flat.alpha_composite(image)
+    return np.asarray(flat.convert('RGB'), dtype=np.uint8)
+
+
+class TalkingHeadRenderer:
+    """Draws animated avatar frames onto a persistent canvas.
+
+    Only the rows touched by the avatar in the previous and current frame are
+    redrawn, and a frame whose pose and mouth level match the previous one is
+    emitted without redrawing at all.
+    """
+
+    def __init__(self, avatar: np.ndarray, width: int = 1280, height: int = 720,
+                 fps: float = 30, style: Optional[str] = None):
+        self.avatar = np.ascontiguousarray(avatar)
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.canvas = np.zeros((height, width, 3), dtype=np.uint8)
+        self.avatar_h, self.avatar_w = self.avatar.shape[:2]
+        self.origin_x = (width - self.avatar_w) // 2
+        self.origin_y = (height - self.avatar_h) // 2
+        self._mouth_region = MOUTH_REGIONS.get(style, DEFAULT_MOUTH_REGION)
+        self._mouth_masks = self._build_mouth_masks()
+        self._dirty: Optional[Tuple[int, int]] = None
+
+    def _build_mouth_masks(self) -> List[Optional[np.ndarray]]:
+        cx, cy, half_w, max_half_h = self._mouth_region
+        rx = half_w * self.avatar_w
+        ry_max = max_half_h * self.avatar_h
+        h = int(np.ceil(2 * ry_max)) + 1
+        w = int(np.ceil(2 * rx)) + 1
+        yy, xx = np.mgrid[0:h, 0:w]
+        yy = yy - (h - 1) / 2
+        xx = xx - (w - 1) / 2
+
+        masks = [None]
+        for level in range(1, MOUTH_LEVELS):
+            ry = max(ry_max * level / (MOUTH_LEVELS - 1), 1.0)
+            masks.append((xx / rx) ** 2 + (yy / ry) ** 2 <= 1.0)
+        self._mouth_origin = (int(cx * self.avatar_w - (w - 1) / 2), int(cy * self.avatar_h - (h - 1) / 2))
+        return masks
+
+    def _draw(self, offset_y: int, mouth_level: int) -> None:
+        top = self.origin_y + offset_y
+        src_top = max(0, -top)
+        src_bottom = min(self.avatar_h, self.height - top)
+        dst_top = top + src_top
+        dst_bottom = top + src_bottom
+
+        # Clear rows the avatar covered last frame but won't cover now
+        if self._dirty is not None:
+            prev_top, prev_bottom = self._dirty
+            if prev_top < dst_top:
+                self.canvas[prev_top:min(prev_bottom, dst_top), self.origin_x:self.origin_x + self.avatar_w] = 0
+            if prev_bottom > dst_bottom:
+                self.canvas[max(prev_top, dst_bottom):prev_bottom, self.origin_x:self.origin_x + self.avatar_w] = 0
+
+        region = self.canvas[dst_top:dst_bottom, self.origin_x:self.origin_x + self.avatar_w]
+        region[:] = self.avatar[src_top:src_bottom]
+        self._dirty = (dst_top, dst_bottom)
+
+        mask = self._mouth_masks[mouth_level]
+        if mask is None:
+            return
+        mouth_x, mouth_y = self._mouth_origin
+        mouth_top = top + mouth_y
+        mask_h, mask_w = mask.shape
+        rows = slice(max(mouth_top, 0), min(mouth_top + mask_h, self.height))
+        mask = mask[rows.start - mouth_top:rows.stop - mouth_top]
+        area = self.canvas[rows, self.origin_x + mouth_x:self.origin_x + mouth_x + mask_w]
+        area[mask[:, :area.shape[1]]] = MOUTH_COLOR
+
+    def frame_states(self, lip_sync: LipSyncTimeline, motion: Optional[KeyframeTrack],
+                     duration: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Per-frame vertical offsets and mouth levels, computed in one vectorized pass"""
+        frame_times = np.arange(int(np.ceil(duration * self.fps)), dtype=np.float32) / self.fps
+        mouth = lip_sync.sample(frame_times)['height'] if len(lip_sync) else np.zeros_like(frame_times)
+        levels = np.clip(np.rint(mouth * (MOUTH_LEVELS - 1)), 0, MOUTH_LEVELS - 1).astype(np.int32)
+
+        if motion is not None and len(motion):
+            pose = motion.sample(frame_times)
+            offsets = np.rint(pose[:, 1] * POSITION_SCALE + pose[:, 3] * NOD_SCALE).astype(np.int32)
+        else:
+            offsets = np.zeros(len(frame_times), dtype=np.int32)
+        return offsets, levels
+
+    def render(self, lip_sync: LipSyncTimeline, motion: Optional[KeyframeTrack],
+               duration: float) -> Iterator[bytes]:
+        """Yield raw rgb24 frames for the whole clip"""
+        offsets, levels = self.frame_states(lip_sync, motion, duration)
+        previous = None
+        frame = b''
+        for state in zip(offsets.tolist(), levels.tolist()):
+            if state != previous:
+                self._draw(*state)
+                frame = self.canvas.tobytes()
+                previous = state
+            yield frame
+
+
+def encode_frames(frames: Iterator[bytes], width: int, height: int, fps: float,
+                  audio_path: str, output_file: str, encoder_args: List[str], duration: float = None) -> None:
+    """Pipe raw rgb24 frames into ffmpeg's stdin and mux them with the audio"""
+    ffmpeg_cmd = [
+        'ffmpeg', '-v', 'error',
+        # Input 1: raw frames from stdin
+        '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{width}x{height}', '-r', str(fps),
+        '-i', 'pipe:0',
+        # Input 2: audio file
+        '-i', audio_path,
+        '-map', '0:v', '-map', '1:a',
+        '-c:a', 'aac',
+        *encoder_args,
+        '-pix_fmt', 'yuv420p',
+        '-movflags', '+faststart',
+        '-shortest',
+        '-y',
+        output_file
+    ]
+    logger.debug(f"Running FFmpeg command: {' '.join(ffmpeg_cmd)}")
+    process = FFmpegProcess(ffmpeg_cmd, 'encode', duration=duration, stdin=True)
+    try:
+        for frame in frames:
+            process.write(frame)
+    except BrokenPipeError:
+        logger.error("FFmpeg closed its input early")
+    except Exception:
+        process.kill()
+        raise
+    finally:
+        process.close_stdin()
+    returncode = process.wait()
+    if returncode != 0:
+        message = process.error_message()
+        logger.error(f"FFmpeg error: {message}")
+        raise Exception(f"FFmpeg processing failed: {message}")
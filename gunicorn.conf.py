@@ -0,0 +1,28 @@
+"""gunicorn settings: load the app once in the master, then fork workers.
+
+    gunicorn -c gunicorn.conf.py main:app
+"""
+import gc
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:8080')
+workers = int(os.environ.get('WEB_CONCURRENCY', 4))
+# segments.py sizes each worker's encoder pool by the number of workers
+os.environ['WEB_CONCURRENCY'] = str(workers)
+# Threaded workers, so open /jobs/<id>/events streams don't each hold a whole process
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+preload_app = os.environ.get('APP_PRELOAD', '1') == '1'
+os.environ['APP_PRELOAD'] = '1' if preload_app else '0'
+
+
+def when_ready(server):
+    # Keep the preloaded objects out of the collector so a worker's GC passes
+    # don't touch (and copy) the pages shared with the master
+    if preload_app:
+        gc.freeze()
+
+
+def post_fork(server, worker):
+    if preload_app:
+        from app import app, start_background
+        start_background(app)
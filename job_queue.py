@@ -0,0 +1,168 @@
+import os
+import time
+import queue
+import logging
+import threading
+from typing import Callable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Number of render threads per web worker process. A segmented render fans
+# out further, to that process's SEGMENT_WORKERS encoder processes (see
+# segments.py); those default to the host's cores divided by WEB_CONCURRENCY
+DEFAULT_RENDER_WORKERS = int(os.environ.get('RENDER_WORKERS', '2'))
+# Seconds an idle render thread waits before looking for queued rows
+RENDER_POLL_SECONDS = float(os.environ.get('RENDER_POLL_SECONDS', 1.0))
+# Seconds between heartbeats for the jobs this process is rendering
+RENDER_HEARTBEAT_SECONDS = float(os.environ.get('RENDER_HEARTBEAT_SECONDS', 30))
+# Seconds between copies of the live progress of those jobs to the database
+RENDER_PROGRESS_SECONDS = float(os.environ.get('RENDER_PROGRESS_SECONDS', 2))
+
+
+class RenderQueue:
+    """Bounded pool of background threads that render queued VideoGeneration jobs.
+
+    Jobs are identified by ``VideoGeneration.id``; the row itself is the durable
+    record, so this queue only carries ids. The handler is expected to claim the
+    row atomically and return whether it did, which makes it safe for several
+    threads and processes to try the same id.
+
+    ``submit`` hands a job to this process's threads right away. Idle threads
+    also call ``poll()`` every ``poll_interval`` seconds for queued ids, oldest
+    first, so rows queued by any process (a batch, a restart) are spread over
+    the render threads of every gunicorn worker.
+
+    Every ``heartbeat_interval`` seconds ``heartbeat(running_ids)`` is called
+    from a separate thread, so rows whose worker died can be told apart from
+    rows still rendering.
+    """
+
+    def __init__(self, handler: Callable[[int], bool], workers: int = DEFAULT_RENDER_WORKERS,
+                 poll: Optional[Callable[[], List[int]]] = None,
+                 heartbeat: Optional[Callable[[List[int]], None]] = None,
+                 progress: Optional[Callable[[List[int]], None]] = None,
+                 poll_interval: float = RENDER_POLL_SECONDS,
+                 heartbeat_interval: float = RENDER_HEARTBEAT_SECONDS,
+                 progress_interval: float = RENDER_PROGRESS_SECONDS):
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.poll = poll
+        self.poll_interval = poll_interval
+        self.heartbeat = heartbeat
+        self.heartbeat_interval = heartbeat_interval
+        self.progress = progress
+        self.progress_interval = progress_interval
+        self._queue: "queue.Queue[Optional[int]]" = queue.Queue()
+        self._threads: List[threading.Thread] = []
+        self._running: Set[int] = set()
+        self._stopped = threading.Event()
+        self._active = 0
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+
+    def start(self, app) -> None:
+        """Start the worker threads, each running jobs inside an app context"""
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked: the parent's threads and queued ids didn't come along
+                self._queue = queue.Queue()
+                self._threads = []
+                self._running = set()
+                self._active = 0
+                self._pid = os.getpid()
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(
+                    target=self._run, args=(app,), name=f'render-worker-{i}', daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+            self._stopped = threading.Event()
+            if self.heartbeat is not None:
+                threading.Thread(target=self._beat, args=(app, self._stopped),
+                                 name='render-heartbeat', daemon=True).start()
+        logger.info(f"Started {self.workers} render workers")
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Ask the workers to exit once the jobs ahead of them are done"""
+        self._stopped.set()
+        threads = self._threads
+        for _ in threads:
+            self._queue.put(None)
+        for thread in threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def submit(self, job_id: int) -> None:
+        """Hand a job to this process's render threads without waiting for a poll"""
+        self._queue.put(job_id)
+        logger.debug(f"Queued render job {job_id}")
+
+    def active(self) -> int:
+        """Number of jobs currently being rendered"""
+        return self._active
+
+    def running(self) -> List[int]:
+        """Ids of the jobs this process is rendering"""
+        with self._lock:
+            return list(self._running)
+
+    def _run(self, app) -> None:
+        while True:
+            try:
+                job_id = self._queue.get(timeout=self.poll_interval if self.poll else None)
+            except queue.Empty:
+                self._render_polled(app)
+                continue
+            if job_id is None:
+                self._queue.task_done()
+                return
+            self._render(app, job_id)
+            self._queue.task_done()
+
+    def _render_polled(self, app) -> None:
+        """Render queued rows until none are left to claim"""
+        while True:
+            try:
+                with app.app_context():
+                    candidates = self.poll()
+            except Exception as e:
+                logger.error(f"Polling for render jobs failed: {str(e)}")
+                return
+            # Other threads race for the same rows; move on to the next one on a lost claim
+            if not any(self._render(app, job_id) for job_id in candidates):
+                return
+
+    def _render(self, app, job_id: int) -> bool:
+        with self._lock:
+            self._active += 1
+            self._running.add(job_id)
+        try:
+            with app.app_context():
+                return bool(self.handler(job_id))
+        except Exception as e:
+            logger.error(f"Render job {job_id} crashed: {str(e)}")
+            return True
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._running.discard(job_id)
+
+    def _beat(self, app, stopped: threading.Event) -> None:
+        # Progress is saved every tick while jobs run; the heartbeat on its own, slower interval
+        interval = min(self.progress_interval, self.heartbeat_interval) if self.progress else self.heartbeat_interval
+        last_beat = None
+        while True:
+            running = self.running()
+            try:
+                with app.app_context():
+                    if self.progress is not None and running:
+                        self.progress(running)
+                    if last_beat is None or time.monotonic() - last_beat >= self.heartbeat_interval:
+                        last_beat = time.monotonic()
+                        self.heartbeat(running)
+            except Exception as e:
+                logger.error(f"Render heartbeat failed: {str(e)}")
+            if stopped.wait(interval):
+                return
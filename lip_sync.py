@@ -1,63 +1,348 @@
-import numpy as np
-import librosa
+import os
+import shutil
 import logging
-import matplotlib.pyplot as plt
-from typing import List, Dict
+import subprocess
+import numpy as np
+from typing import List, Dict, Iterator, Optional, Sequence, Union
 
 # Logger Setup
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class LipSyncTimeline:
+    """Array-backed lip sync keyframes.
+
+    Holds timestamps and mouth parameters as contiguous float32 arrays.
+    Indexing and iteration yield the keyframe dicts the rest of the code
+    expects, built on demand.
+    """
+
+    def __init__(self, timestamps: np.ndarray, mouth_open: np.ndarray,
+                 width: np.ndarray = None, height: np.ndarray = None):
+        self.timestamps = np.ascontiguousarray(timestamps, dtype=np.float32)
+        self.mouth_open = np.ascontiguousarray(mouth_open, dtype=np.float32)
+        self.width = np.ascontiguousarray(
+            1.0 + self.mouth_open * 0.2 if width is None else width, dtype=np.float32)
+        self.height = np.ascontiguousarray(
+            self.mouth_open if height is None else height, dtype=np.float32)
+
+    @classmethod
+    def empty(cls) -> 'LipSyncTimeline':
+        return cls(np.zeros(0), np.zeros(0))
+
+    @classmethod
+    def from_keyframes(cls, keyframes: Sequence[Dict]) -> 'LipSyncTimeline':
+        """Build a timeline from a list of keyframe dicts"""
+        if isinstance(keyframes, cls):
+            return keyframes
+        return cls(
+            np.array([k['timestamp'] for k in keyframes]),
+            np.array([k['mouth_open'] for k in keyframes]),
+            np.array([k['mouth_shape']['width'] for k in keyframes]),
+            np.array([k['mouth_shape']['height'] for k in keyframes])
+        )
+
+    @property
+    def duration(self) -> float:
+        return float(self.timestamps[-1]) if len(self) else 0.0
+
+    def sample(self, timestamps: Union[np.ndarray, Sequence[float]]) -> Dict[str, np.ndarray]:
+        """Interpolate mouth parameters at many timestamps in one call.
+
+        Timestamps outside the timeline clamp to the first/last keyframe.
+        """
+        t = np.asarray(timestamps, dtype=np.float32)
+        if not len(self):
+            return {
+                'mouth_open': np.zeros_like(t),
+                'width': np.ones_like(t),
+                'height': np.zeros_like(t)
+            }
+        return {
+            'mouth_open': np.interp(t, self.timestamps, self.mouth_open).astype(np.float32),
+            'width': np.interp(t, self.timestamps, self.width).astype(np.float32),
+            'height': np.interp(t, self.timestamps, self.height).astype(np.float32)
+        }
+
+    def sample_frames(self, fps: float, duration: float = None) -> Dict[str, np.ndarray]:
+        """Sample the timeline at every video frame"""
+        duration = self.duration if duration is None else duration
+        frame_times = np.arange(int(np.ceil(duration * fps)), dtype=np.float32) / fps
+        samples = self.sample(frame_times)
+        samples['timestamp'] = frame_times
+        return samples
+
+    def index_at(self, timestamp: float) -> int:
+        """Index of the last keyframe at or before timestamp (-1 if none)"""
+        return int(np.searchsorted(self.timestamps, timestamp, side='right')) - 1
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def __getitem__(self, index: int) -> Dict:
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return {
+            'timestamp': float(self.timestamps[index]),
+            'mouth_open': float(self.mouth_open[index]),
+            'mouth_shape': {
+                'width': float(self.width[index]),
+                'height': float(self.height[index])
+            }
+        }
+
+    def __iter__(self) -> Iterator[Dict]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def to_list(self) -> List[Dict]:
+        return list(self)
+
+
+# 'stream' decodes through ffmpeg in blocks; 'librosa' loads the whole file
+DEFAULT_DECODER = os.environ.get('LIPSYNC_DECODER', 'stream')
+# Directory for opt-in waveform/envelope debug plots
+DEBUG_PLOT_DIR = os.environ.get('LIPSYNC_DEBUG_PLOT_DIR')
+# 'auto' builds visemes from TTS word boundaries when the audio has them and
+# falls back to the RMS envelope; 'audio' always decodes the audio
+LIPSYNC_SOURCE = os.environ.get('LIPSYNC_SOURCE', 'auto')
+
+# Mouth pose per viseme: (mouth_open, width, height), on the RMS path's 0-0.8 scale
+VISEMES = {
+    'rest': (0.0, 1.0, 0.0),
+    'MBP': (0.0, 0.95, 0.0),
+    'FV': (0.15, 1.05, 0.1),
+    'TH': (0.25, 1.05, 0.2),
+    'DNT': (0.3, 1.1, 0.25),
+    'SH': (0.3, 0.9, 0.3),
+    'R': (0.35, 0.85, 0.3),
+    'W': (0.25, 0.7, 0.25),
+    'KG': (0.4, 1.05, 0.35),
+    'AA': (0.8, 1.15, 0.8),
+    'E': (0.55, 1.3, 0.45),
+    'I': (0.45, 1.35, 0.35),
+    'O': (0.65, 0.8, 0.7),
+    'U': (0.4, 0.75, 0.4),
+}
+
+# English spelling to visemes; digraphs are matched before single letters
+GRAPHEMES = {
+    'th': 'TH', 'sh': 'SH', 'ch': 'SH', 'ph': 'FV', 'wh': 'W', 'ng': 'KG', 'ck': 'KG',
+    'ee': 'I', 'ea': 'I', 'oo': 'U', 'ou': 'O', 'ow': 'O', 'oa': 'O', 'au': 'O', 'aw': 'O',
+    'ai': 'E', 'ay': 'E',
+    'a': 'AA', 'e': 'E', 'i': 'I', 'o': 'O', 'u': 'U', 'y': 'I',
+    'b': 'MBP', 'p': 'MBP', 'm': 'MBP', 'f': 'FV', 'v': 'FV',
+    't': 'DNT', 'd': 'DNT', 'n': 'DNT', 'l': 'DNT', 's': 'DNT', 'z': 'DNT',
+    'c': 'KG', 'k': 'KG', 'g': 'KG', 'q': 'KG', 'x': 'KG', 'h': 'KG',
+    'j': 'SH', 'r': 'R', 'w': 'W',
+}
+
+# Words further apart than this close the mouth in between
+WORD_GAP_SECONDS = 0.08
+
+def word_visemes(word: str) -> List[str]:
+    """Approximate viseme sequence for a written word"""
+    word = word.lower()
+    if len(word) > 2 and word.endswith('e') and word[-2] not in 'aeiouy':
+        word = word[:-1]  # silent final e
+    visemes = []
+    i = 0
+    while i < len(word):
+        viseme = GRAPHEMES.get(word[i:i + 2]) if i + 1 < len(word) else None
+        step = 2 if viseme else 1
+        if viseme is None:
+            viseme = GRAPHEMES.get(word[i])
+        if viseme is None and word[i].isalnum():
+            # Other scripts and digits: alternate open and closing shapes per character
+            viseme = 'DNT' if visemes and visemes[-1] == 'E' else 'E'
+        if viseme and (not visemes or visemes[-1] != viseme):
+            visemes.append(viseme)
+        i += step
+    return visemes
+
+
+class StreamingRMS:
+    """Incremental RMS envelope matching ``librosa.feature.rms(center=True)``.
+
+    Samples are fed in arbitrary blocks; only the last partial frame is kept
+    between calls, so memory stays bounded regardless of audio length.
+    """
+
+    def __init__(self, frame_length: int, hop_length: int):
+        self.frame_length = frame_length
+        self.hop_length = hop_length
+        # librosa centers frames by zero-padding half a frame on each side
+        self._buffer = np.zeros(frame_length // 2, dtype=np.float32)
+        self._chunks: List[np.ndarray] = []
+        self._samples = 0
+
+    def feed(self, samples: np.ndarray) -> None:
+        self._samples += len(samples)
+        self._buffer = np.concatenate([self._buffer, samples.astype(np.float32, copy=False)])
+        self._emit()
+
+    def finish(self) -> np.ndarray:
+        self._buffer = np.concatenate([self._buffer, np.zeros(self.frame_length // 2, dtype=np.float32)])
+        expected = 1 + self._samples // self.hop_length
+        self._emit()
+        rms = np.concatenate(self._chunks) if self._chunks else np.zeros(0, dtype=np.float32)
+        return rms[:expected]
+
+    def _emit(self) -> None:
+        available = len(self._buffer) - self.frame_length
+        if available < 0:
+            return
+        count = available // self.hop_length + 1
+        frames = np.lib.stride_tricks.sliding_window_view(self._buffer, self.frame_length)[::self.hop_length][:count]
+        self._chunks.append(np.sqrt(np.mean(np.square(frames, dtype=np.float32), axis=1)))
+        self._buffer = self._buffer[count * self.hop_length:]
+
 class LipSync:
-    def __init__(self):
+    def __init__(self, decoder: str = DEFAULT_DECODER, debug_plot_dir: Optional[str] = DEBUG_PLOT_DIR):
         self.sample_rate = 22050
         self.hop_length = 512
         self.frame_length = 2048
+        self.decoder = decoder
+        self.debug_plot_dir = debug_plot_dir
+        # Samples read from ffmpeg per block in the streaming decoder
+        self.block_size = self.hop_length * 256
 
-    def analyze_audio(self, audio_path: str) -> List[Dict[str, float]]:
+    def analyze_audio(self, audio_path: str) -> LipSyncTimeline:
         """Analyze audio file and generate lip sync data"""
         try:
-            # Load audio file
-            y, sr = librosa.load(audio_path, sr=self.sample_rate)
-            
+            if self.decoder == 'stream' and shutil.which('ffmpeg'):
+                rms = self._stream_rms(audio_path)
+            else:
+                rms = self._librosa_rms(audio_path)
+
             # Error Handling: Check if audio is empty
-            if y is None or len(y) == 0:
+            if rms is None or len(rms) == 0:
                 logger.error("❌ Error: Loaded audio is empty! Check file format.")
-                return []
-            
-            logger.info(f"✅ Audio Loaded: {y.shape}, Sample Rate: {sr}")
-
-            # Plot Audio Waveform (Debugging)
-            self._plot_waveform(y)
+                return LipSyncTimeline.empty()
 
             # Calculate amplitude envelope
-            amplitude_envelope = self._get_amplitude_envelope(y)
-            
+            amplitude_envelope = self._normalize_envelope(rms)
+
+            if self.debug_plot_dir:
+                self._plot_envelope(audio_path, amplitude_envelope)
+
             # Convert to lip movements
             lip_movements = self._amplitude_to_lip_movement(amplitude_envelope)
             
             return lip_movements
         except Exception as e:
             logger.error(f"❌ Error analyzing audio: {str(e)}")
-            return []
+            return LipSyncTimeline.empty()
 
-    def _plot_waveform(self, y: np.ndarray):
-        """Plot audio waveform for debugging"""
-        plt.figure(figsize=(10, 4))
-        plt.plot(y, alpha=0.7)
-        plt.title("Audio Waveform")
-        plt.xlabel("Samples")
-        plt.ylabel("Amplitude")
-        plt.show()
+    def analyze_speech(self, audio_path: str, boundaries: Optional[Sequence[Dict]] = None,
+                       duration: float = None, source: str = LIPSYNC_SOURCE) -> LipSyncTimeline:
+        """Viseme timeline from TTS word boundaries, or the audio envelope without them"""
+        if source != 'audio' and boundaries:
+            timeline = self.from_boundaries(boundaries, duration)
+            if len(timeline):
+                return timeline
+        return self.analyze_audio(audio_path)
 
-    def _get_amplitude_envelope(self, y: np.ndarray) -> np.ndarray:
-        """Calculate amplitude envelope of the audio signal"""
+    def from_boundaries(self, boundaries: Sequence[Dict], duration: float = None) -> LipSyncTimeline:
+        """Build viseme keyframes from word boundaries (seconds) without decoding audio.
+
+        Each word's visemes share its spoken span evenly; the mouth closes
+        between words separated by a pause.
+        """
+        times, poses = [0.0], [VISEMES['rest']]
+
+        def add(t: float, pose: tuple) -> None:
+            if t > times[-1]:
+                times.append(t)
+                poses.append(pose)
+
+        # Punctuation gets boundaries of its own but no visemes; drop it so the
+        # pause after "Hello," is measured to the next spoken word
+        words = [(b, word_visemes(b.get('text', ''))) for b in boundaries
+                 if b.get('type', 'WordBoundary') == 'WordBoundary']
+        words = [(b, visemes) for b, visemes in words if visemes]
+        prev_end = None
+        for index, (boundary, visemes) in enumerate(words):
+            start, length = boundary['offset'], boundary['duration']
+            end = start + length
+            # Hold the mouth closed up to a word that follows a pause
+            if prev_end is None or start - prev_end > WORD_GAP_SECONDS:
+                add(start, VISEMES['rest'])
+            prev_end = end
+            slot = length / len(visemes)
+            for i, viseme in enumerate(visemes):
+                add(start + slot * (i + 0.5), VISEMES[viseme])
+            following = words[index + 1][0]['offset'] if index + 1 < len(words) else None
+            if following is None or following - end > WORD_GAP_SECONDS:
+                add(end, VISEMES['rest'])
+
+        if len(times) == 1:
+            return LipSyncTimeline.empty()
+        if duration is not None:
+            add(duration, VISEMES['rest'])
+        open_, width, height = np.array(poses, dtype=np.float32).T
+        return LipSyncTimeline(np.array(times), open_, width, height)
+
+    def _librosa_rms(self, audio_path: str) -> np.ndarray:
+        """Decode the whole file with librosa and compute its RMS envelope"""
+        import librosa
+
+        y, sr = librosa.load(audio_path, sr=self.sample_rate)
+        if y is None or len(y) == 0:
+            return np.zeros(0)
+        logger.debug(f"✅ Audio Loaded: {y.shape}, Sample Rate: {sr}")
+        return librosa.feature.rms(y=y, frame_length=self.frame_length, hop_length=self.hop_length)[0]
+
+    def _stream_rms(self, audio_path: str) -> np.ndarray:
+        """Decode through ffmpeg in fixed-size blocks, computing RMS incrementally"""
+        cmd = [
+            'ffmpeg', '-v', 'error', '-i', audio_path,
+            '-f', 'f32le', '-ac', '1', '-ar', str(self.sample_rate), '-'
+        ]
+        envelope = StreamingRMS(self.frame_length, self.hop_length)
+        block_bytes = self.block_size * 4
+        with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as process:
+            pending = b''
+            while True:
+                data = process.stdout.read(block_bytes)
+                if not data:
+                    break
+                data = pending + data
+                usable = len(data) - len(data) % 4
+                pending = data[usable:]
+                envelope.feed(np.frombuffer(data[:usable], dtype=np.float32))
+            stderr = process.stderr.read()
+            if process.wait() != 0:
+                raise Exception(f"ffmpeg decode failed: {stderr.decode(errors='replace')}")
+        return envelope.finish()
+
+    def _plot_envelope(self, audio_path: str, envelope: np.ndarray) -> None:
+        """Write the amplitude envelope to a PNG for debugging"""
         try:
-            # Calculate RMS energy for each frame
-            rms = librosa.feature.rms(y=y, frame_length=self.frame_length, hop_length=self.hop_length)[0]
-            
-            # Debugging Logs
-            logger.info(f"📊 RMS Shape: {rms.shape}, Min: {rms.min()}, Max: {rms.max()}")
+            import matplotlib
+            matplotlib.use('Agg')
+            import matplotlib.pyplot as plt
+
+            os.makedirs(self.debug_plot_dir, exist_ok=True)
+            name = os.path.splitext(os.path.basename(audio_path))[0]
+            plot_path = os.path.join(self.debug_plot_dir, f"{name}_envelope.png")
+            timestamps = np.arange(len(envelope)) * (self.hop_length / self.sample_rate)
+
+            fig, ax = plt.subplots(figsize=(10, 4))
+            ax.plot(timestamps, envelope, alpha=0.7)
+            ax.set_title("Amplitude Envelope")
+            ax.set_xlabel("Seconds")
+            ax.set_ylabel("Amplitude")
+            fig.savefig(plot_path)
+            plt.close(fig)
+            logger.debug(f"Wrote lip sync debug plot: {plot_path}")
+        except Exception as e:
+            logger.warning(f"Failed to write debug plot: {str(e)}")
+
+    def _normalize_envelope(self, rms: np.ndarray) -> np.ndarray:
+        """Normalize an RMS envelope to the 0..1 range"""
+        try:
+            logger.debug(f"📊 RMS Shape: {rms.shape}, Min: {rms.min()}, Max: {rms.max()}")
 
             # Error Handling: Check if min and max are same (Avoid division by zero)
             if rms.max() == rms.min():
@@ -72,74 +357,45 @@ class LipSync:
             logger.error(f"❌ Error calculating amplitude envelope: {str(e)}")
             return np.zeros(1)
 
-    def _amplitude_to_lip_movement(self, amplitude: np.ndarray) -> List[Dict[str, float]]:
+    def _get_amplitude_envelope(self, y: np.ndarray) -> np.ndarray:
+        """Calculate amplitude envelope of the audio signal"""
+        envelope = StreamingRMS(self.frame_length, self.hop_length)
+        envelope.feed(np.asarray(y, dtype=np.float32))
+        return self._normalize_envelope(envelope.finish())
+
+    def _amplitude_to_lip_movement(self, amplitude: np.ndarray) -> LipSyncTimeline:
         """Convert amplitude data to lip movement keyframes"""
         try:
-            movements = []
-            for i, amp in enumerate(amplitude):
-                # Calculate time in seconds
-                time = (i * self.hop_length) / self.sample_rate
-                
-                # Map amplitude to mouth opening
-                mouth_open = amp * 0.8  # Scale factor for mouth movement
-                
-                # Generate keyframe
-                keyframe = {
-                    'timestamp': time,
-                    'mouth_open': float(mouth_open),
-                    'mouth_shape': {
-                        'width': 1.0 + float(mouth_open * 0.2),  # Slight width variation
-                        'height': float(mouth_open)
-                    }
-                }
-                movements.append(keyframe)
+            # Time in seconds of each RMS frame
+            timestamps = np.arange(len(amplitude)) * (self.hop_length / self.sample_rate)
+
+            # Map amplitude to mouth opening
+            mouth_open = np.asarray(amplitude, dtype=np.float32) * 0.8  # Scale factor for mouth movement
+
+            movements = LipSyncTimeline(timestamps, mouth_open)
 
             logger.info(f"✅ {len(movements)} Lip Movements Generated.")
-            
-            # Debug First 10 Movements
-            for i, movement in enumerate(movements[:10]):  
-                logger.info(f"🔹 Time: {movement['timestamp']}s, Mouth Open: {movement['mouth_open']}")
-            
             return movements
         except Exception as e:
             logger.error(f"❌ Error converting amplitude to lip movement: {str(e)}")
-            return []
+            return LipSyncTimeline.empty()
 
-    def get_frame_data(self, lip_movements: List[Dict[str, float]], timestamp: float) -> Dict[str, float]:
+    def get_frame_data(self, lip_movements: Union[LipSyncTimeline, List[Dict[str, float]]],
+                       timestamp: float) -> Dict[str, float]:
         """Get interpolated lip shape data for a specific timestamp"""
         try:
-            if not lip_movements:
+            if not len(lip_movements):
                 logger.warning("⚠️ Warning: Lip movement data is empty!")
                 return {'mouth_open': 0.0, 'mouth_shape': {'width': 1.0, 'height': 0.0}}
 
-            # Find surrounding keyframes
-            prev_frame = None
-            next_frame = None
-            
-            for frame in lip_movements:
-                if frame['timestamp'] <= timestamp:
-                    prev_frame = frame
-                if frame['timestamp'] > timestamp and next_frame is None:
-                    next_frame = frame
-                    break
-
-            if prev_frame is None:
-                return lip_movements[0]
-            if next_frame is None:
-                return prev_frame
-
-            # Interpolate between frames
-            t_diff = next_frame['timestamp'] - prev_frame['timestamp']
-            if t_diff == 0:
-                return prev_frame
-
-            alpha = self._clamp((timestamp - prev_frame['timestamp']) / t_diff, 0.0, 1.0)
-
+            # Prefer sample() on a timeline when looking up many timestamps
+            timeline = LipSyncTimeline.from_keyframes(lip_movements)
+            frame = timeline.sample([timestamp])
             return {
-                'mouth_open': self._lerp(prev_frame['mouth_open'], next_frame['mouth_open'], alpha),
+                'mouth_open': float(frame['mouth_open'][0]),
                 'mouth_shape': {
-                    'width': self._lerp(prev_frame['mouth_shape']['width'], next_frame['mouth_shape']['width'], alpha),
-                    'height': self._lerp(prev_frame['mouth_shape']['height'], next_frame['mouth_shape']['height'], alpha)
+                    'width': float(frame['width'][0]),
+                    'height': float(frame['height'][0])
                 }
             }
         except Exception as e:
@@ -1,8 +1,8 @@
-from app import app, db  # Import `app` and `db` from `app.py`
+import os
+from app import init_app
 
-# Create database tables if they don't exist
-with app.app_context():
-    db.create_all()
+# gunicorn.conf.py sets APP_PRELOAD when workers are forked from a preloaded master
+app = init_app(preload=os.environ.get('APP_PRELOAD') == '1')
 
 if __name__ == "__main__":
     app.run(debug=True)  # Run Flask with debugging enabled
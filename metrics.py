@@ -0,0 +1,240 @@
+import time
+import bisect
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from progress import report
+
+logger = logging.getLogger(__name__)
+
+# Seconds; spans a cached lookup up to a long archive-profile encode
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+# Stage timings of the render running in the current context, persisted on its row
+_job_stages: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar('job_stages', default=None)
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Iterable[Tuple[str, str]] = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def expose(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(key)} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelKey, List] = {}  # key -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def totals(self) -> Dict[LabelKey, Tuple[int, float]]:
+        """``(count, sum)`` per label set"""
+        with self._lock:
+            return {key: (count, total) for key, (_, total, count) in self._series.items()}
+
+    def expose(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f'{self.name}_bucket{_format_labels(key, [("le", _format_value(float(bound)))])} {cumulative}')
+                lines.append(f'{self.name}_bucket{_format_labels(key, [("le", "+Inf")])} {count}')
+                lines.append(f'{self.name}_sum{_format_labels(key)} {_format_value(total)}')
+                lines.append(f'{self.name}_count{_format_labels(key)} {count}')
+        return lines
+
+
+class Gauge:
+    """A value read at scrape time from a callback returning ``{labels: value}`` pairs"""
+
+    metric_type = 'gauge'
+
+    def __init__(self, name: str, help_text: str, collect: Callable[[], Iterable[Tuple[Dict[str, str], float]]]):
+        self.name = name
+        self.help = help_text
+        self.collect = collect
+
+    def expose(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.metric_type}']
+        try:
+            samples = sorted((_label_key(labels), value) for labels, value in self.collect())
+        except Exception as e:
+            logger.error(f"Error collecting {self.name}: {str(e)}")
+            return lines
+        for key, value in samples:
+            lines.append(f'{self.name}{_format_labels(key)} {_format_value(value)}')
+        return lines
+
+
+class CounterFunc(Gauge):
+    """A counter read at scrape time from a callback, for running totals kept elsewhere"""
+
+    metric_type = 'counter'
+
+
+class Registry:
+    """Process-local metrics rendered in the Prometheus text exposition format.
+
+    Each gunicorn worker keeps its own registry, so a scrape reports the
+    worker that happened to serve it. Rows persisted on VideoGeneration are
+    the complete record across workers.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            self._metrics.setdefault(metric.name, metric)
+            return self._metrics[metric.name]
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._register(Counter(name, help_text))
+
+    def histogram(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, buckets))
+
+    def gauge(self, name: str, help_text: str, collect: Callable) -> Gauge:
+        with self._lock:
+            gauge = Gauge(name, help_text, collect)
+            self._metrics[name] = gauge  # re-registering replaces the callback
+            return gauge
+
+    def counter_func(self, name: str, help_text: str, collect: Callable) -> CounterFunc:
+        with self._lock:
+            counter = CounterFunc(name, help_text, collect)
+            self._metrics[name] = counter
+            return counter
+
+    def expose(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.expose())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+stage_seconds = registry.histogram(
+    'video_pipeline_stage_seconds', 'Time spent in each render pipeline stage'
+)
+render_seconds = registry.histogram(
+    'video_render_seconds', 'End-to-end render time per job, by outcome'
+)
+renders_total = registry.counter('video_renders_total', 'Finished render jobs, by outcome')
+bytes_written_total = registry.counter('video_bytes_written_total', 'Bytes of media written, by kind')
+ffmpeg_killed_total = registry.counter(
+    'video_ffmpeg_killed_total', 'ffmpeg processes killed by the stall or total timeout'
+)
+
+
+@contextmanager
+def track_job() -> Iterator[Dict[str, float]]:
+    """Collect the stage timings of one render into the yielded dict"""
+    stages: Dict[str, float] = {}
+    token = _job_stages.set(stages)
+    try:
+        yield stages
+    finally:
+        _job_stages.reset(token)
+
+
+def record_stage(stage: str, seconds: float) -> None:
+    """Add a stage duration to the histogram and to the current job, if any"""
+    stage_seconds.observe(seconds, stage=stage)
+    stages = _job_stages.get()
+    if stages is not None:
+        stages[stage] = round(stages.get(stage, 0.0) + seconds, 4)
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """Time the enclosed block as a pipeline stage and report it as the current job's stage"""
+    report(stage)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
+
+
+def record_bytes(kind: str, size: int) -> None:
+    bytes_written_total.inc(size, kind=kind)
+
+
+def cache_gauges(caches: Callable[[], Dict[str, Dict[str, float]]]) -> None:
+    """Expose DiskCache.stats() for a group of caches, labelled by cache name.
+
+    The running totals are counters (``video_cache_hits_total`` ...), so
+    rate() handles worker restarts; sizes and the hit rate are gauges.
+    """
+    for field, help_text in (
+        ('hits', 'Cache lookups served from disk'),
+        ('misses', 'Cache lookups that missed'),
+        ('coalesced', 'Requests that joined an in-flight computation'),
+        ('evictions', 'Entries evicted'),
+    ):
+        registry.counter_func(f'video_cache_{field}_total', help_text,
+                              lambda field=field: [({'cache': cache}, stats[field]) for cache, stats in caches().items()])
+    for field, help_text in (
+        ('entries', 'Entries currently cached'),
+        ('bytes', 'Bytes currently cached'),
+        ('hit_rate', 'Fraction of lookups that hit'),
+    ):
+        metric = f'video_cache_{field}'
+        registry.gauge(metric, help_text,
+                       lambda field=field: [({'cache': cache}, stats[field]) for cache, stats in caches().items()])
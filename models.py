@@ -1,26 +1,150 @@
+import os
+import json
+import logging
+import sqlite3
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import column_property, deferred
+
+logger = logging.getLogger(__name__)
 
 db = SQLAlchemy()
 
+# How long a SQLite writer waits for the lock before failing with "database is locked"
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+
+# Characters of the script shown in listings; the full text is loaded on demand
+TEXT_PREVIEW_CHARS = 120
+
+
+@event.listens_for(Engine, 'connect')
+def _configure_sqlite(dbapi_connection, connection_record):
+    """WAL lets readers run alongside the single writer instead of blocking on it"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute(f'PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}')
+    cursor.close()
+
+
 class VideoGeneration(db.Model):
     __tablename__ = 'video_generations'
 
     id = db.Column(db.Integer, primary_key=True)
-    text = db.Column(db.Text, nullable=False)
+    text = deferred(db.Column(db.Text, nullable=False))
     avatar_url = db.Column(db.String(500), nullable=False)
     voice = db.Column(db.String(50), nullable=False)
     video_path = db.Column(db.String(255))
-    status = db.Column(db.String(20), default='processing')  # processing, completed, failed
-    created_at = db.Column(db.DateTime, default=db.func.datetime('now', 'utc'))  # ✅ SQLite-friendly
+    status = db.Column(db.String(20), default='queued', index=True)  # queued, processing, completed, failed
+    profile = db.Column(db.String(20))  # encoding profile, see video_processor.ENCODING_PROFILES
+    fingerprint = db.Column(db.String(64), index=True)  # see video_processor.render_fingerprint
+    tts_seconds = db.Column(db.Float)
+    encode_seconds = db.Column(db.Float)
+    stages = db.Column(db.Text)  # JSON: seconds per pipeline stage, see metrics.record_stage
+    error = db.Column(db.Text)
+    heartbeat_at = db.Column(db.Float)  # unix time, refreshed while a worker renders the row
+    attempts = db.Column(db.Integer, default=0)  # times the row has been claimed
+    progress = db.Column(db.Text)  # JSON: latest stage and fraction, copied from the rendering worker
+    created_at = db.Column(db.DateTime, default=db.func.datetime('now', 'utc'), index=True)  # ✅ SQLite-friendly
+    completed_at = db.Column(db.DateTime)
 
-    def to_dict(self):
+    __table_args__ = (
+        # At most one queued or rendering job per fingerprint, so identical
+        # requests that race past the duplicate check attach to one job
+        db.Index('uq_video_generations_active_fingerprint', 'fingerprint', unique=True,
+                 sqlite_where=db.text("status IN ('queued', 'processing')"),
+                 postgresql_where=db.text("status IN ('queued', 'processing')")),
+    )
+
+    @property
+    def video_url(self):
+        """Download URL for the rendered video, relative to output/"""
+        if not self.video_path:
+            return None
+        return f"/download/{os.path.relpath(self.video_path, 'output').replace(os.sep, '/')}"
+
+    def to_dict(self, include_text: bool = True):
         return {
             'id': self.id,
-            'text': self.text,
+            **({'text': self.text} if include_text else {'text_preview': self.text_preview}),
             'avatar_url': self.avatar_url,
             'voice': self.voice,
             'video_path': self.video_path,
+            'video_url': self.video_url,
             'status': self.status,
-            'created_at': self.created_at.isoformat()
+            'profile': self.profile,
+            'fingerprint': self.fingerprint,
+            'tts_seconds': self.tts_seconds,
+            'encode_seconds': self.encode_seconds,
+            'stages': json.loads(self.stages) if self.stages else None,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
         }
 
+
+# A prefix of the script computed by the database, so listings never load the full text
+VideoGeneration.text_preview = column_property(
+    db.func.substr(VideoGeneration.__table__.c.text, 1, TEXT_PREVIEW_CHARS)
+)
+
+
+class Batch(db.Model):
+    """A group of generations submitted together, for aggregate progress"""
+    __tablename__ = 'batches'
+
+    id = db.Column(db.Integer, primary_key=True)
+    total = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, default=db.func.datetime('now', 'utc'))
+    items = db.relationship('BatchItem', backref='batch', order_by='BatchItem.position', lazy='dynamic')
+
+
+class BatchItem(db.Model):
+    """One row of a batch; identical rows share a generation"""
+    __tablename__ = 'batch_items'
+
+    batch_id = db.Column(db.Integer, db.ForeignKey('batches.id'), primary_key=True)
+    position = db.Column(db.Integer, primary_key=True)
+    generation_id = db.Column(db.Integer, db.ForeignKey('video_generations.id'), nullable=False, index=True)
+
+
+class Artifact(db.Model):
+    """A rendered file under output/, tracked for size-budgeted eviction"""
+    __tablename__ = 'artifacts'
+
+    id = db.Column(db.Integer, primary_key=True)
+    path = db.Column(db.String(255), nullable=False, unique=True)
+    size = db.Column(db.Integer, nullable=False)
+    generation_id = db.Column(db.Integer, db.ForeignKey('video_generations.id'), index=True)
+    created_at = db.Column(db.DateTime, default=db.func.datetime('now', 'utc'))
+    last_accessed = db.Column(db.Float, nullable=False, index=True)  # unix time, for LRU ordering
+
+
+def upgrade_schema() -> None:
+    """Add columns and indexes missing from an existing table (create_all never alters tables)"""
+    inspector = inspect(db.engine)
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=db.engine.dialect)
+            db.session.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+    db.session.commit()
+
+    for table in db.metadata.sorted_tables:
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            try:
+                index.create(bind=db.engine)
+            except IntegrityError as e:
+                # Rows queued twice before the index existed; it is retried on the next start
+                logger.warning(f"Could not create index {index.name}: {str(e)}")
@@ -0,0 +1,86 @@
+import os
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+# How long finished jobs stay available to late subscribers
+PROGRESS_RETAIN_SECONDS = float(os.environ.get('PROGRESS_RETAIN_SECONDS', 600))
+
+# Job whose progress reports from the current context belong to
+_current_job: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar('progress_job', default=None)
+
+
+class ProgressHub:
+    """Latest progress of each render job, with blocking waits for updates.
+
+    Process-local like the metrics registry: a subscriber only sees live
+    progress for jobs rendering in its own worker process. The row status
+    in VideoGeneration is the record across workers.
+    """
+
+    def __init__(self, retain_seconds: float = PROGRESS_RETAIN_SECONDS):
+        self.retain_seconds = retain_seconds
+        self._jobs: Dict[int, dict] = {}
+        self._condition = threading.Condition()
+
+    def publish(self, job_id: int, **fields) -> None:
+        """Replace the job's stage fields; status carries over until changed"""
+        with self._condition:
+            previous = self._jobs.get(job_id, {})
+            self._jobs[job_id] = {
+                'job_id': job_id,
+                'status': previous.get('status', 'processing'),
+                'stage': None,
+                'fraction': None,
+                **fields,
+                'seq': previous.get('seq', 0) + 1,
+                'updated': time.time()
+            }
+            self._prune()
+            self._condition.notify_all()
+
+    def finish(self, job_id: int, status: str, **fields) -> None:
+        self.publish(job_id, status=status, done=True, **fields)
+
+    def get(self, job_id: int) -> Optional[dict]:
+        with self._condition:
+            return self._jobs.get(job_id)
+
+    def wait(self, job_id: int, seq: int, timeout: float) -> Optional[dict]:
+        """The job's state once it is newer than seq, or None after timeout"""
+        def newer() -> bool:
+            state = self._jobs.get(job_id)
+            return state is not None and state['seq'] > seq
+
+        with self._condition:
+            if self._condition.wait_for(newer, timeout):
+                return self._jobs[job_id]
+            return None
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.retain_seconds
+        for job_id in [job_id for job_id, state in self._jobs.items()
+                       if state.get('done') and state['updated'] < cutoff]:
+            del self._jobs[job_id]
+
+
+progress_hub = ProgressHub()
+
+
+@contextmanager
+def track_progress(job_id: int) -> Iterator[None]:
+    """Attribute progress reports in the enclosed block to job_id"""
+    token = _current_job.set(job_id)
+    try:
+        yield
+    finally:
+        _current_job.reset(token)
+
+
+def report(stage: str, fraction: float = None, **fields) -> None:
+    """Publish the current job's stage and completed fraction, if a job is being tracked"""
+    job_id = _current_job.get()
+    if job_id is not None:
+        progress_hub.publish(job_id, stage=stage, fraction=fraction, **fields)
@@ -0,0 +1,71 @@
+"""Render a batch of videos from a CSV or JSON Lines script file.
+
+    python render_batch.py scripts.csv --avatar URL --voice en-US-GuyNeural --profile draft
+
+Each row needs a ``text`` column and may override ``avatar``, ``voice`` and
+``profile``. Jobs go through the same queue, caches and dedup as the web API.
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Render videos for every row of a CSV/JSONL file')
+    parser.add_argument('file', help='CSV with a header row, or JSON Lines')
+    parser.add_argument('--avatar', help='Avatar URL for rows without one')
+    parser.add_argument('--voice', help='Voice for rows without one')
+    parser.add_argument('--profile', help='Encoding profile for rows without one')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2,
+                        help='Concurrent renders (default: one per core)')
+    parser.add_argument('--out', help='Copy finished videos into this directory')
+    parser.add_argument('--interval', type=float, default=2.0, help='Seconds between progress reports')
+    args = parser.parse_args()
+
+    # Read before importing the app, which builds its render queue at import time
+    os.environ.setdefault('RENDER_WORKERS', str(args.workers))
+    from app import init_app, submit_batch
+    from batches import BatchError, parse_batch_file, normalize_batch_items, batch_progress, batch_items
+    from models import db, Batch
+
+    with open(args.file, 'r', encoding='utf-8-sig') as f:
+        content = f.read()
+    defaults = {'avatar': args.avatar, 'voice': args.voice, 'profile': args.profile}
+    try:
+        items = normalize_batch_items(parse_batch_file(content, args.file), defaults)
+    except BatchError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+
+    app = init_app()
+    with app.app_context():
+        batch_id = submit_batch(items).id
+        print(f"Batch {batch_id}: {len(items)} items")
+        while True:
+            db.session.expire_all()
+            progress = batch_progress(db.session.get(Batch, batch_id))
+            rate = progress['videos_per_minute']
+            print(f"{progress['done']}/{progress['total']} done "
+                  f"({progress['completed']} ok, {progress['failed']} failed, {progress['processing']} rendering) "
+                  f"{progress['elapsed_seconds']}s"
+                  + (f", {rate} videos/min" if rate else ''))
+            if progress['finished']:
+                break
+            time.sleep(args.interval)
+
+        items = batch_items(db.session.get(Batch, batch_id))
+        for item in items:
+            if item['status'] == 'failed':
+                print(f"row {item['position'] + 1} failed: {item['error']}", file=sys.stderr)
+        if args.out:
+            os.makedirs(args.out, exist_ok=True)
+            for item in items:
+                if item['video_path'] and os.path.exists(item['video_path']):
+                    shutil.copy(item['video_path'], os.path.join(args.out, f"{item['position'] + 1:04d}.mp4"))
+    return 1 if progress['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,163 @@
+import os
+import re
+import logging
+from typing import TYPE_CHECKING, Callable, List, Optional, Tuple
+from cache import DiskCache, content_key
+from metrics import timed
+from ffmpeg_runner import FFmpegProcess
+from progress import report
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Scripts longer than this are split and rendered segment by segment
+SEGMENT_MAX_CHARS = int(os.environ.get('SEGMENT_MAX_CHARS', 400))
+# Segment encoder processes per web worker. Every gunicorn worker has its own
+# pool, so by default the cores are shared out across WEB_CONCURRENCY
+# processes (exported by gunicorn.conf.py) instead of each taking them all
+WEB_CONCURRENCY = max(1, int(os.environ.get('WEB_CONCURRENCY', 1)))
+SEGMENT_WORKERS = int(os.environ.get('SEGMENT_WORKERS', max(1, (os.cpu_count() or 2) // WEB_CONCURRENCY)))
+
+# Sentence ends: Latin punctuation and the Devanagari danda
+_SENTENCE_END = re.compile(r'(?<=[.!?।])\s+')
+
+segment_cache = DiskCache(
+    root=os.path.join('output', 'cache', 'segments'),
+    suffix='.mp4',
+    max_bytes=int(os.environ.get('SEGMENT_CACHE_MAX_BYTES', 2 * 1024 * 1024 * 1024)),
+    max_age_seconds=float(os.environ.get('SEGMENT_CACHE_MAX_AGE_HOURS', 24 * 7)) * 3600
+)
+
+_pool: Optional["ProcessPoolExecutor"] = None
+
+
+def split_sentences(text: str, max_chars: int = SEGMENT_MAX_CHARS) -> List[str]:
+    """Split text at sentence boundaries into segments of at most max_chars.
+
+    Sentences are packed greedily; a single sentence longer than max_chars
+    becomes a segment of its own.
+    """
+    segments = []
+    current = ''
+    for sentence in _SENTENCE_END.split(text.strip()):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            segments.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        segments.append(current)
+    return segments
+
+
+def segment_key(text: str, voice: str, avatar_url: str, profile: str, mode: str) -> str:
+    return content_key('segment-v2', text, voice, avatar_url, profile, mode)
+
+
+def render_segment(job: Tuple[str, str, str, str, str]) -> str:
+    """Synthesize and encode one segment; runs in a worker process"""
+    # Imported here so the pool workers only load what a render needs
+    from tts_engine import generate_speech
+    from video_processor import create_video
+
+    text, voice, avatar_url, profile, mode = job
+    key = segment_key(text, voice, avatar_url, profile, mode)
+    cached = segment_cache.lookup(key)
+    if cached:
+        logger.debug(f"Segment cache hit: {cached}")
+        return cached
+
+    audio_path = generate_speech(text, voice)
+    temp_file = segment_cache.temp_path(key)
+    try:
+        create_video(avatar_url, audio_path, text, mode=mode, profile=profile, output_file=temp_file,
+                     segment=True)
+        return segment_cache.commit(key, temp_file)
+    finally:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
+
+def get_pool(initializer: Callable = None, initargs: tuple = ()) -> "ProcessPoolExecutor":
+    """Process pool shared by all segmented renders in this process.
+
+    ``initializer`` runs in each worker and only applies to the call that
+    creates the pool; the benchmark uses it to install its fakes.
+    """
+    global _pool
+    if _pool is None:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        # Spawn rather than fork: the web process runs render threads
+        _pool = ProcessPoolExecutor(max_workers=SEGMENT_WORKERS,
+                                    mp_context=multiprocessing.get_context('spawn'),
+                                    initializer=initializer, initargs=initargs)
+    return _pool
+
+
+def concat_segments(segment_paths: List[str], output_file: str) -> None:
+    """Join segments encoded with identical settings without re-encoding"""
+    list_file = f"{output_file}.txt"
+    with open(list_file, 'w') as f:
+        for path in segment_paths:
+            f.write(f"file '{os.path.abspath(path)}'\n")
+
+    ffmpeg_cmd = [
+        'ffmpeg', '-v', 'error',
+        '-f', 'concat', '-safe', '0',
+        '-i', list_file,
+        '-c', 'copy',
+        '-movflags', '+faststart',
+        '-y',
+        output_file
+    ]
+    try:
+        logger.debug(f"Running FFmpeg command: {' '.join(ffmpeg_cmd)}")
+        process = FFmpegProcess(ffmpeg_cmd, 'concat')
+        if process.wait() != 0:
+            message = process.error_message()
+            logger.error(f"FFmpeg error: {message}")
+            raise Exception(f"FFmpeg concat failed: {message}")
+    finally:
+        os.remove(list_file)
+
+
+def create_segmented_video(avatar_url: str, text: str, voice: str, profile: str,
+                           mode: str, output_file: str = None) -> str:
+    """Render a long script as parallel sentence segments and concatenate them"""
+    from concurrent.futures import as_completed
+    from video_processor import DEFAULT_PROFILE, DEFAULT_RENDER_MODE, new_output_path
+
+    profile = profile or DEFAULT_PROFILE
+    mode = mode or DEFAULT_RENDER_MODE
+    try:
+        segments = split_sentences(text)
+        logger.debug(f"Rendering {len(segments)} segments")
+
+        # Identical segments (e.g. a repeated line) are rendered once
+        jobs = list(dict.fromkeys((segment, voice, avatar_url, profile, mode) for segment in segments))
+        # Worker processes keep their own metrics; the parent times the whole fan-out
+        with timed('segments'):
+            futures = {get_pool().submit(render_segment, job): job for job in jobs}
+            rendered = {}
+            for future in as_completed(futures):
+                rendered[futures[future]] = future.result()
+                report('segments', len(rendered) / len(jobs))
+        segment_paths = [rendered[(segment, voice, avatar_url, profile, mode)] for segment in segments]
+
+        if output_file is None:
+            os.makedirs("output", exist_ok=True)
+            output_file = new_output_path()
+        with timed('concat'):
+            concat_segments(segment_paths, output_file)
+
+        logger.info(f"Successfully created segmented video: {output_file}")
+        return output_file
+    except Exception as e:
+        logger.error(f"Error creating segmented video: {str(e)}")
+        raise Exception(f"Failed to create video: {str(e)}")
@@ -1,3 +1,7 @@
+// Binary timeline served by /timeline/<id>; layout documented in timeline.py
+const TIMELINE_MAGIC = 'AVTL';
+const TIMELINE_VERSION = 1;
+
 class AvatarRenderer {
     constructor(svgElement) {
         this.svg = svgElement;
@@ -46,13 +50,88 @@ class AvatarRenderer {
         avatar.appendChild(this.headGroup);
     }
 
+    // ✅ Fetch a generation's tracks as Float32Arrays, no per-frame objects
+    async loadTimeline(url) {
+        let response = await fetch(url);
+        // 202 until the render has stored the timeline
+        while (response.status === 202) {
+            const delay = Number(response.headers.get('Retry-After')) || 2;
+            await new Promise(resolve => setTimeout(resolve, delay * 1000));
+            response = await fetch(url);
+        }
+        if (!response.ok) throw new Error(`Failed to load timeline: ${response.status}`);
+        const tracks = AvatarRenderer.parseTimeline(await response.arrayBuffer());
+        this.setLipSync(tracks.LIPS);
+        this.setAnimation(tracks.MOTN);
+        return tracks;
+    }
+
+    static parseTimeline(buffer) {
+        const view = new DataView(buffer);
+        const magic = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+        const version = view.getUint16(4, true);
+        if (magic !== TIMELINE_MAGIC || version !== TIMELINE_VERSION) {
+            throw new Error(`Unsupported timeline ${magic} v${version}`);
+        }
+        const count = view.getUint16(6, true);
+        const tracks = { duration: view.getFloat32(8, true) };
+        let dataOffset = 12 + count * 12;
+        for (let i = 0; i < count; i++) {
+            const header = 12 + i * 12;
+            const name = String.fromCharCode(...new Uint8Array(buffer, header, 4));
+            const rows = view.getUint32(header + 4, true);
+            const columns = [];
+            for (let c = view.getUint32(header + 8, true); c > 0; c--) {
+                // Views into the response buffer, not copies
+                columns.push(new Float32Array(buffer, dataOffset, rows));
+                dataOffset += rows * 4;
+            }
+            tracks[name] = { timestamps: columns[0], columns: columns.slice(1) };
+        }
+        return tracks;
+    }
+
+    // Tracks are { timestamps, columns } of Float32Arrays; arrays of frame
+    // objects are converted once here
+    static toTrack(frames, getters) {
+        if (!Array.isArray(frames)) return frames;
+        return {
+            timestamps: Float32Array.from(frames, frame => frame.timestamp),
+            columns: getters.map(get => Float32Array.from(frames, get))
+        };
+    }
+
     setAnimation(animationData) {
-        this.currentAnimation = animationData;
+        this.currentAnimation = AvatarRenderer.toTrack(animationData, [
+            f => f.position.x, f => f.position.y, f => f.position.z,
+            f => f.rotation.x, f => f.rotation.y, f => f.rotation.z
+        ]);
         this.startTime = performance.now();
     }
 
     setLipSync(lipSyncData) {
-        this.lipSyncData = lipSyncData;
+        this.lipSyncData = AvatarRenderer.toTrack(lipSyncData, [
+            f => f.mouth_open, f => f.mouth_shape.width, f => f.mouth_shape.height
+        ]);
+    }
+
+    // Interpolated value of every column of a track at time t
+    static sampleTrack(track, t) {
+        const times = track.timestamps;
+        if (!times || times.length === 0) return null;
+
+        // Last keyframe at or before t
+        let low = 0;
+        let high = times.length - 1;
+        while (low < high) {
+            const mid = (low + high + 1) >> 1;
+            if (times[mid] <= t) low = mid;
+            else high = mid - 1;
+        }
+        const next = Math.min(low + 1, times.length - 1);
+        const span = times[next] - times[low];
+        const k = span > 0 ? Math.min(Math.max((t - times[low]) / span, 0), 1) : 0;
+        return track.columns.map(column => column[low] + (column[next] - column[low]) * k);
     }
 
     animate() {
@@ -71,49 +150,17 @@ class AvatarRenderer {
     }
 
     getCurrentFrame(currentTime) {
-        if (!this.currentAnimation || this.currentAnimation.length === 0) return null;
-
-        let prevFrame = null;
-        let nextFrame = null;
-
-        for (const frame of this.currentAnimation) {
-            if (frame.timestamp <= currentTime) {
-                prevFrame = frame;
-            }
-            if (frame.timestamp > currentTime && !nextFrame) {
-                nextFrame = frame;
-                break;
-            }
-        }
+        if (!this.currentAnimation) return null;
+        const values = AvatarRenderer.sampleTrack(this.currentAnimation, currentTime);
+        if (!values) return null;
 
-        if (!prevFrame) return this.currentAnimation[0];
-        if (!nextFrame) return prevFrame;
-
-        const t = (currentTime - prevFrame.timestamp) / 
-                 (nextFrame.timestamp - prevFrame.timestamp);
-        
-        return this.interpolateFrames(prevFrame, nextFrame, t);
-    }
-
-    interpolateFrames(a, b, t) {
+        const [px, py, pz, rx, ry, rz] = values;
         return {
-            position: {
-                x: this.lerp(a.position.x, b.position.x, t),
-                y: this.lerp(a.position.y, b.position.y, t),
-                z: this.lerp(a.position.z, b.position.z, t)
-            },
-            rotation: {
-                x: this.lerp(a.rotation.x, b.rotation.x, t),
-                y: this.lerp(a.rotation.y, b.rotation.y, t),
-                z: this.lerp(a.rotation.z, b.rotation.z, t)
-            }
+            position: { x: px, y: py, z: pz },
+            rotation: { x: rx, y: ry, z: rz }
         };
     }
 
-    lerp(a, b, t) {
-        return a + (b - a) * t;
-    }
-
     applyTransforms(frame) {
         if (!this.headGroup || !this.bodyGroup) return;
 
@@ -141,12 +188,12 @@ class AvatarRenderer {
     }
 
     getLipSyncData(currentTime) {
-        if (!this.lipSyncData || this.lipSyncData.length === 0) return null;
+        if (!this.lipSyncData) return null;
+        const values = AvatarRenderer.sampleTrack(this.lipSyncData, currentTime);
+        if (!values) return null;
 
-        return this.lipSyncData.find(frame => 
-            frame.timestamp <= currentTime && 
-            frame.timestamp + 0.1 > currentTime
-        ) || this.lipSyncData[this.lipSyncData.length - 1];
+        const [mouthOpen, width, height] = values;
+        return { mouth_open: mouthOpen, mouth_shape: { width, height } };
     }
 
     startAnimation() {
@@ -1,5 +1,6 @@
 let selectedAvatar = null;
 let currentVideoPath = null;
+let currentVideoUrl = null;
 let audioElement = null; // Global audio element
 
 document.addEventListener('DOMContentLoaded', () => {
@@ -72,19 +73,37 @@ async function generateVideo() {
             body: JSON.stringify({ text: textInput, avatar: selectedAvatar, voice, speed, background_music: bgMusic })
         });
 
-        const data = await response.json();
-        if (data.error) throw new Error(data.error);
+        const queued = await response.json();
+        if (queued.error) throw new Error(queued.error);
+
+        // ✅ Render runs in the background, follow its progress until it finishes
+        const data = await waitForJob(queued);
 
         // ✅ Fix Lip Sync Delay
         currentVideoPath = data.video_path;
+        currentVideoUrl = data.generation.video_url;
         const videoElement = document.getElementById('videoPreview');
-        videoElement.src = `/download/${currentVideoPath.split('/').pop()}`;
+        videoElement.src = `${currentVideoUrl}?inline=1`;
+
+        // ✅ Drive the page avatar with the tracks the video was rendered from
+        const renderer = window.avatarRenderer;
+        if (renderer) {
+            renderer.loadTimeline(`/timeline/${data.job_id}`)
+                .catch(error => console.error('Error loading timeline:', error));
+        }
 
         // ✅ Sync Video & Audio
         if (audioElement) audioElement.pause();
         audioElement = new Audio(data.audio_url);
         videoElement.onplay = () => {
             setTimeout(() => audioElement.play(), 500); // 500ms delay for better sync
+            if (renderer && renderer.currentAnimation) {
+                renderer.startTime = performance.now() - videoElement.currentTime * 1000;
+                renderer.startAnimation();
+            }
+        };
+        videoElement.onpause = () => {
+            if (renderer) renderer.stopAnimation();
         };
 
         document.getElementById('previewSection').classList.remove('d-none');
@@ -98,6 +117,43 @@ async function generateVideo() {
     }
 }
 
+// ✅ Follow a render job over Server-Sent Events, falling back to polling
+function waitForJob(job) {
+    if (!window.EventSource || !job.events_url) return pollJob(job.status_url);
+    return new Promise((resolve, reject) => {
+        const source = new EventSource(job.events_url);
+        source.addEventListener('progress', event => updateProgress(JSON.parse(event.data)));
+        source.addEventListener('status', event => {
+            const data = JSON.parse(event.data);
+            if (data.progress) updateProgress(data.progress);
+            if (data.status === 'completed') {
+                source.close();
+                resolve(data);
+            } else if (data.status === 'failed') {
+                source.close();
+                reject(new Error(data.generation.error || 'Video generation failed'));
+            }
+        });
+        // EventSource reconnects by itself; CLOSED means the server refused the stream
+        source.onerror = () => {
+            if (source.readyState === EventSource.CLOSED) pollJob(job.status_url).then(resolve, reject);
+        };
+    });
+}
+
+// ✅ Poll a render job until it completes or fails
+async function pollJob(statusUrl, intervalMs = 1500) {
+    while (true) {
+        const response = await fetch(statusUrl);
+        const data = await response.json();
+        if (data.error) throw new Error(data.error);
+        if (data.progress) updateProgress(data.progress);
+        if (data.status === 'completed') return data;
+        if (data.status === 'failed') throw new Error(data.generation.error || 'Video generation failed');
+        await new Promise(resolve => setTimeout(resolve, intervalMs));
+    }
+}
+
 // ✅ Input Validation
 function validateInputs() {
     if (!selectedAvatar) {
@@ -119,6 +175,29 @@ function showProgress() {
     document.getElementById('generateBtn').insertAdjacentElement('afterend', progress);
 }
 
+const STAGE_LABELS = {
+    tts: 'Generating speech',
+    avatar_download: 'Fetching avatar',
+    rasterize: 'Preparing avatar',
+    lip_sync: 'Syncing lips',
+    encode: 'Encoding video',
+    stream_encode: 'Encoding video',
+    segments: 'Rendering segments',
+    concat: 'Joining segments',
+    store: 'Saving video',
+    timeline: 'Saving animation timeline'
+};
+
+// ✅ Show the current render stage, and how far along it is when known
+function updateProgress(state) {
+    const bar = document.querySelector('.progress-wrapper .progress-bar');
+    if (!bar) return;
+    const label = STAGE_LABELS[state.stage] || (state.status === 'queued' ? 'Queued' : 'Rendering');
+    const known = state.fraction !== null && state.fraction !== undefined;
+    bar.style.width = known ? `${Math.round(state.fraction * 100)}%` : '100%';
+    bar.textContent = known ? `${label} ${Math.round(state.fraction * 100)}%` : label;
+}
+
 function hideProgress() {
     const progress = document.querySelector('.progress-wrapper');
     if (progress) progress.remove();
@@ -150,7 +229,7 @@ function downloadVideo() {
         showToast('No video available for download', 'warning');
         return;
     }
-    window.location.href = `/download/${currentVideoPath.split('/').pop()}`;
+    window.location.href = currentVideoUrl;
 }
 
 // ✅ Share Video Function
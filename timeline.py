@@ -0,0 +1,122 @@
+import os
+import gzip
+import struct
+import logging
+import threading
+from typing import TYPE_CHECKING, List, Optional, Tuple
+from cache import DiskCache, content_key
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Binary timeline served by /timeline/<id> for the browser AvatarRenderer.
+# Little-endian, and every section is a multiple of 4 bytes so the client
+# can view the data in place as Float32Arrays:
+#
+#   header  'AVTL', uint16 version, uint16 track count, float32 duration
+#   tracks  per track: 4-byte name, uint32 rows, uint32 columns
+#   data    per track, column-major float32; column 0 is the timestamps
+#
+# 'LIPS' columns: timestamp, mouth_open, width, height
+# 'MOTN' columns: timestamp, position x/y/z, rotation x/y/z
+TIMELINE_MAGIC = b'AVTL'
+TIMELINE_VERSION = 1
+
+# Stored gzip-compressed; served as-is to clients that accept gzip
+timeline_cache = DiskCache(
+    root=os.path.join('output', 'cache', 'timeline'),
+    suffix='.bin.gz',
+    max_bytes=int(os.environ.get('TIMELINE_CACHE_MAX_BYTES', 256 * 1024 * 1024)),
+    max_age_seconds=float(os.environ.get('TIMELINE_CACHE_MAX_AGE_HOURS', 24 * 7)) * 3600
+)
+
+
+def encode_timeline(tracks: List[Tuple[bytes, "np.ndarray"]], duration: float) -> bytes:
+    """Pack (name, columns x rows array) tracks into the binary layout above"""
+    import numpy as np
+
+    header = struct.pack('<4sHHf', TIMELINE_MAGIC, TIMELINE_VERSION, len(tracks), duration)
+    for name, columns in tracks:
+        header += struct.pack('<4sII', name, columns.shape[1], columns.shape[0])
+    return header + b''.join(np.ascontiguousarray(columns, dtype='<f4').tobytes() for _, columns in tracks)
+
+
+def build_timeline(text: str, voice: str, fps: float) -> bytes:
+    """Lip sync and motion tracks for a script, laid out as its video was rendered"""
+    import numpy as np
+    from segments import split_sentences
+    from tts_engine import generate_speech, speech_duration
+    from video_processor import build_tracks
+
+    # Segmented renders restart the tracks at each segment; reuse the same audio
+    segments = split_sentences(text)
+    if len(segments) <= 1:
+        segments = [text]
+
+    lips, motion = [], []
+    offset = 0.0
+    for segment in segments:
+        audio_path = generate_speech(segment, voice)
+        duration = speech_duration(audio_path)
+        if duration is None:
+            raise Exception(f"Could not determine audio duration: {audio_path}")
+        lip_track, motion_track = build_tracks(audio_path, duration, fps)
+        lips.append(np.stack([lip_track.timestamps + offset, lip_track.mouth_open,
+                              lip_track.width, lip_track.height]))
+        motion.append(np.vstack([motion_track.timestamps[None] + offset, motion_track.values.T]))
+        offset += duration
+
+    return encode_timeline([(b'LIPS', np.hstack(lips)), (b'MOTN', np.hstack(motion))], offset)
+
+
+def timeline_key(text: str, voice: str, fps: float) -> str:
+    from lip_sync import LIPSYNC_SOURCE
+
+    return content_key('timeline', TIMELINE_VERSION, text, voice, fps, LIPSYNC_SOURCE)
+
+
+def lookup_timeline(text: str, voice: str, fps: float) -> Optional[str]:
+    """Path of the cached timeline for a script, or None if it hasn't been built"""
+    return timeline_cache.lookup(timeline_key(text, voice, fps))
+
+
+def get_timeline_path(text: str, voice: str, fps: float) -> str:
+    """Path of the gzip-compressed timeline for a script, building it on a miss.
+
+    Runs as a render stage once the video's speech is cached, so building
+    only recomputes the tracks.
+    """
+    key = timeline_key(text, voice, fps)
+    cached = timeline_cache.lookup(key)
+    if cached:
+        return cached
+
+    future, owner = timeline_cache.claim(key)
+    if not owner:
+        return future.result()
+
+    try:
+        data = build_timeline(text, voice, fps)
+        temp_path = timeline_cache.temp_path(key)
+        with open(temp_path, 'wb') as f:
+            f.write(gzip.compress(data, compresslevel=6))
+        path = timeline_cache.commit(key, temp_path)
+    except Exception as e:
+        timeline_cache.fail(key, e)
+        raise
+    timeline_cache.resolve(key, path)
+    logger.debug(f"Built timeline {key}: {len(data)} bytes")
+    return path
+
+
+def build_timeline_async(text: str, voice: str, fps: float) -> None:
+    """Rebuild a finished generation's timeline (evicted, or older than the stage) off the request"""
+    def build() -> None:
+        try:
+            get_timeline_path(text, voice, fps)
+        except Exception as e:
+            logger.error(f"Error building timeline: {str(e)}")
+
+    threading.Thread(target=build, name='timeline-build', daemon=True).start()
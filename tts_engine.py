@@ -1,26 +1,187 @@
 import os
+import json
+import weakref
 import asyncio
-import edge_tts
 import logging
-from datetime import datetime
+from typing import TYPE_CHECKING, AsyncIterator, Optional, Tuple
+from cache import DiskCache, content_key
+from event_loop import BackgroundLoop
+from metrics import record_bytes, timed
+from utils import mp3_duration
+
+if TYPE_CHECKING:
+    import edge_tts
 
 logger = logging.getLogger(__name__)
 
-async def generate_speech_async(text: str, voice: str) -> str:
-    """Generate speech using Edge TTS"""
+# Default Edge TTS prosody settings; part of the cache key
+DEFAULT_RATE = '+0%'
+DEFAULT_VOLUME = '+0%'
+DEFAULT_PITCH = '+0Hz'
+
+speech_cache = DiskCache(
+    root=os.path.join('output', 'cache', 'tts'),
+    suffix='.mp3',
+    max_bytes=int(os.environ.get('TTS_CACHE_MAX_BYTES', 512 * 1024 * 1024)),
+    max_age_seconds=float(os.environ.get('TTS_CACHE_MAX_AGE_HOURS', 24 * 7)) * 3600
+)
+
+# Duration and word boundaries captured during synthesis, stored next to the audio
+speech_metadata = DiskCache(
+    root=speech_cache.root,
+    suffix='.json',
+    max_bytes=speech_cache.max_bytes // 8,
+    max_age_seconds=speech_cache.max_age_seconds
+)
+
+# Edge TTS reports offsets and durations in 100 ns ticks
+TICKS_PER_SECOND = 10_000_000
+
+# Client limits: concurrent syntheses per process, retries before the first
+# audio chunk, and the longest wait for any single chunk
+TTS_MAX_CONCURRENCY = int(os.environ.get('TTS_MAX_CONCURRENCY', 8))
+TTS_RETRIES = int(os.environ.get('TTS_RETRIES', 2))
+TTS_RETRY_BACKOFF = float(os.environ.get('TTS_RETRY_BACKOFF', 0.5))
+TTS_CHUNK_TIMEOUT = float(os.environ.get('TTS_CHUNK_TIMEOUT', 30))
+
+
+# One long-lived loop per process serves every synchronous caller
+tts_loop = BackgroundLoop('tts-loop')
+
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+def _semaphore() -> asyncio.Semaphore:
+    """Concurrency limit for the running loop (asyncio primitives are loop-bound)"""
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(TTS_MAX_CONCURRENCY)
+    return semaphore
+
+def _retryable_errors() -> Tuple[type, ...]:
+    # edge_tts pulls in aiohttp; both load on first synthesis, not at startup
+    import aiohttp
+    import edge_tts
+    return (asyncio.TimeoutError, aiohttp.ClientError, edge_tts.exceptions.EdgeTTSException)
+
+def _communicate(text: str, voice: str, **settings) -> "edge_tts.Communicate":
+    """Create a Communicate that reports word boundaries where the installed edge_tts supports it"""
+    import edge_tts
+    try:
+        return edge_tts.Communicate(text, voice, boundary='WordBoundary', **settings)
+    except TypeError:
+        return edge_tts.Communicate(text, voice, **settings)
+
+def get_speech_metadata(audio_path: str) -> Optional[dict]:
+    """Metadata recorded when audio_path was synthesized, or None"""
+    key = os.path.splitext(os.path.basename(audio_path))[0]
+    path = speech_metadata.lookup(key)
+    if not path:
+        return None
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def speech_duration(audio_path: str) -> Optional[float]:
+    """Audio duration from synthesis metadata, falling back to the MP3 frame headers"""
+    metadata = get_speech_metadata(audio_path)
+    if metadata and metadata.get('duration'):
+        return metadata['duration']
+    return mp3_duration(audio_path)
+
+def _commit_speech(key: str, temp_file: str, boundaries: list) -> str:
+    """Store finished audio and its metadata in the cache"""
+    duration = mp3_duration(temp_file)
+    if duration is None and boundaries:
+        duration = boundaries[-1]['offset'] + boundaries[-1]['duration']
+
+    # Metadata first, so whoever sees the audio can also see its duration
+    temp_meta = speech_metadata.temp_path(key)
+    with open(temp_meta, 'w') as f:
+        json.dump({'duration': duration, 'boundaries': boundaries}, f)
+    speech_metadata.commit(key, temp_meta)
+    record_bytes('audio', os.path.getsize(temp_file))
+    return speech_cache.commit(key, temp_file)
+
+def speech_cache_key(text: str, voice: str, rate: str = DEFAULT_RATE,
+                     volume: str = DEFAULT_VOLUME, pitch: str = DEFAULT_PITCH) -> str:
+    """Cache key for a synthesized utterance"""
+    return content_key('tts-v1', text, voice, rate, volume, pitch)
+
+async def stream_speech(text: str, voice: str, rate: str = DEFAULT_RATE,
+                       volume: str = DEFAULT_VOLUME, pitch: str = DEFAULT_PITCH) -> AsyncIterator[bytes]:
+    """Yield MP3 chunks as Edge TTS produces them; the complete audio is cached when the stream ends"""
+    key = speech_cache_key(text, voice, rate, volume, pitch)
+
+    for attempt in range(TTS_RETRIES + 1):
+        temp_file = speech_cache.temp_path(key)
+        boundaries = []
+        started = False
+        try:
+            async with _semaphore():
+                communicate = _communicate(text, voice, rate=rate, volume=volume, pitch=pitch)
+                stream = communicate.stream()
+                with open(temp_file, 'wb') as f:
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(stream.__anext__(), TTS_CHUNK_TIMEOUT)
+                        except StopAsyncIteration:
+                            break
+                        if chunk['type'] == 'audio':
+                            f.write(chunk['data'])
+                            started = True
+                            yield chunk['data']
+                        elif chunk['type'] in ('WordBoundary', 'SentenceBoundary'):
+                            boundaries.append({
+                                'type': chunk['type'],
+                                'offset': chunk['offset'] / TICKS_PER_SECOND,
+                                'duration': chunk['duration'] / TICKS_PER_SECOND,
+                                'text': chunk['text']
+                            })
+            _commit_speech(key, temp_file, boundaries)
+            return
+        except Exception as e:
+            # Audio already handed to the consumer can't be taken back
+            if not isinstance(e, _retryable_errors()) or started or attempt == TTS_RETRIES:
+                raise
+            delay = TTS_RETRY_BACKOFF * 2 ** attempt
+            logger.warning(f"TTS attempt {attempt + 1} failed ({type(e).__name__}: {e}), retrying in {delay}s")
+            await asyncio.sleep(delay)
+        finally:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
+async def generate_speech_async(text: str, voice: str, rate: str = DEFAULT_RATE,
+                                volume: str = DEFAULT_VOLUME, pitch: str = DEFAULT_PITCH) -> str:
+    """Generate speech using Edge TTS, reusing cached audio for identical requests"""
+    key = speech_cache_key(text, voice, rate, volume, pitch)
+    cached = speech_cache.lookup(key)
+    if cached:
+        logger.debug(f"TTS cache hit: {cached}")
+        return cached
+
+    # Concurrent identical requests wait for the first synthesis instead of repeating it
+    future, owner = speech_cache.claim(key)
+    if not owner:
+        logger.debug(f"Waiting for in-flight synthesis of {key}")
+        return await asyncio.wrap_future(future)
+
     try:
-        communicate = edge_tts.Communicate(text, voice)
-        
-        # Generate unique filename
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_file = f"output/speech_{timestamp}.mp3"
-        
-        await communicate.save(output_file)
+        with timed('tts'):
+            async for _ in stream_speech(text, voice, rate, volume, pitch):
+                pass
+        output_file = speech_cache.path_for(key)
+
+        speech_cache.resolve(key, output_file)
         return output_file
     except Exception as e:
         logger.error(f"Error generating speech: {str(e)}")
-        raise Exception("Failed to generate speech")
+        error = Exception("Failed to generate speech")
+        speech_cache.fail(key, error)
+        raise error
 
-def generate_speech(text: str, voice: str) -> str:
-    """Synchronous wrapper for speech generation"""
-    return asyncio.run(generate_speech_async(text, voice))
+def generate_speech(text: str, voice: str, **settings) -> str:
+    """Synchronous wrapper for speech generation, run on the shared TTS loop"""
+    return tts_loop.run(generate_speech_async(text, voice, **settings))
@@ -1,26 +1,69 @@
-import os
-import glob
-import time
 import logging
-from typing import List
+from typing import List, Optional
 
 logger = logging.getLogger(__name__)
 
-def cleanup_old_files(max_age_hours: int = 24) -> None:
-    """Remove files older than specified hours"""
+# MPEG audio bitrates in kbps, indexed by [version is MPEG-1][layer][bitrate index]
+_MP3_BITRATES = {
+    True: {
+        1: [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+        2: [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+        3: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    },
+    False: {
+        1: [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+        2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+        3: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    },
+}
+_MP3_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+def mp3_duration(path: str) -> Optional[float]:
+    """Duration of an MP3 file in seconds, from its frame headers (no decoding)"""
     try:
-        current_time = time.time()
-        max_age_seconds = max_age_hours * 3600
-        
-        patterns = ['output/*.mp4', 'output/*.mp3']
-        
-        for pattern in patterns:
-            files = glob.glob(pattern)
-            for file in files:
-                if os.path.exists(file):
-                    file_age = current_time - os.path.getctime(file)
-                    if file_age > max_age_seconds:
-                        os.remove(file)
-                        logger.debug(f"Removed old file: {file}")
-    except Exception as e:
-        logger.error(f"Error cleaning up files: {str(e)}")
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        logger.error(f"Error reading MP3 file: {str(e)}")
+        return None
+
+    pos = 0
+    # Skip an ID3v2 tag; its size is a 28-bit syncsafe integer
+    if data[:3] == b'ID3' and len(data) >= 10:
+        pos = 10 + ((data[6] & 0x7f) << 21 | (data[7] & 0x7f) << 14 | (data[8] & 0x7f) << 7 | (data[9] & 0x7f))
+
+    samples = 0
+    sample_rate = None
+    while pos + 4 <= len(data):
+        header = int.from_bytes(data[pos:pos + 4], 'big')
+        if header & 0xffe00000 != 0xffe00000:
+            pos += 1
+            continue
+        version = (header >> 19) & 0x3
+        layer = 4 - ((header >> 17) & 0x3)
+        bitrate_index = (header >> 12) & 0xf
+        rate_index = (header >> 10) & 0x3
+        padding = (header >> 9) & 0x1
+        if version == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+            pos += 1
+            continue
+
+        mpeg1 = version == 3
+        bitrate = _MP3_BITRATES[mpeg1][layer][bitrate_index] * 1000
+        rate = _MP3_SAMPLE_RATES[version][rate_index]
+        if layer == 1:
+            frame_samples = 384
+            frame_length = (12 * bitrate // rate + padding) * 4
+        else:
+            frame_samples = 1152 if (layer == 2 or mpeg1) else 576
+            frame_length = frame_samples // 8 * bitrate // rate + padding
+
+        # A Xing/Info header frame carries metadata, not audio
+        if sample_rate is not None or data.find(b'Xing', pos, pos + 40) < 0 and data.find(b'Info', pos, pos + 40) < 0:
+            samples += frame_samples
+        sample_rate = rate
+        pos += frame_length
+
+    if not sample_rate:
+        return None
+    return samples / sample_rate
@@ -1,97 +1,201 @@
 import os
+import time
+import asyncio
 import logging
-import subprocess
-from datetime import datetime
-import cairosvg
-import requests
-from io import BytesIO
+import uuid
+import contextvars
+from typing import TYPE_CHECKING, Tuple
+from avatar_store import avatar_store
+from cache import content_key
+from ffmpeg_runner import FFmpegProcess
+from metrics import record_stage, timed
+from tts_engine import (
+    get_speech_metadata, speech_cache, speech_cache_key, speech_duration, stream_speech, tts_loop
+)
+
+if TYPE_CHECKING:
+    from lip_sync import LipSyncTimeline
+    from animation_engine import KeyframeTrack
 
 logger = logging.getLogger(__name__)
 
-def create_video(avatar_url: str, audio_path: str, text: str) -> str:
-    """Create video with avatar animation and audio"""
-    try:
-        # Create output directory if it doesn't exist
-        os.makedirs("output", exist_ok=True)
+# 'animated' bakes lip sync and head motion into the video; 'static' loops a still avatar
+DEFAULT_RENDER_MODE = os.environ.get('VIDEO_RENDER_MODE', 'animated')
 
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_file = f"output/video_{timestamp}.mp4"
+# x264 settings, output size and frame rate per encoding profile
+ENCODING_PROFILES = {
+    'draft': {'preset': 'ultrafast', 'crf': 30, 'width': 854, 'height': 480, 'fps': 15},
+    'standard': {'preset': 'veryfast', 'crf': 23, 'width': 1280, 'height': 720, 'fps': 25},
+    'archive': {'preset': 'slow', 'crf': 18, 'width': 1920, 'height': 1080, 'fps': 30},
+}
+DEFAULT_PROFILE = os.environ.get('VIDEO_PROFILE', 'standard')
 
-        # Download and convert SVG to PNG
-        try:
-            logger.debug(f"Downloading SVG from: {avatar_url}")
-            response = requests.get(avatar_url)
-            response.raise_for_status()
-            svg_content = response.content
+# A still picture only needs a couple of frames per second
+STATIC_FPS = 2
 
-            # Convert SVG to PNG
-            png_path = f"output/avatar_{timestamp}.png"
-            logger.debug(f"Converting SVG to PNG: {png_path}")
-            cairosvg.svg2png(bytestring=svg_content, write_to=png_path, output_width=720, output_height=720)
+# Overlap TTS and encoding for static renders whose audio isn't cached yet
+STREAMING_RENDER = os.environ.get('STREAMING_RENDER', '1') == '1'
 
-            if not os.path.exists(png_path):
-                raise Exception("Failed to create PNG from SVG")
+def get_profile(name: str = None) -> dict:
+    """Look up an encoding profile, raising ValueError for unknown names"""
+    name = name or DEFAULT_PROFILE
+    if name not in ENCODING_PROFILES:
+        raise ValueError(f"Unknown encoding profile: {name}")
+    return ENCODING_PROFILES[name]
 
-        except Exception as e:
-            logger.error(f"Error converting SVG to PNG: {str(e)}")
-            raise Exception(f"Failed to process avatar image: {str(e)}")
+def render_fingerprint(text: str, avatar_url: str, voice: str, profile: str = None, mode: str = None) -> str:
+    """Hash of everything that determines a rendered video, for deduplicating requests"""
+    return content_key('render-v1', text, avatar_url, voice, profile or DEFAULT_PROFILE,
+                       mode or DEFAULT_RENDER_MODE)
 
-        # Get audio duration using ffprobe
-        try:
-            probe_cmd = [
-                'ffprobe', 
-                '-v', 'error',
-                '-show_entries', 'format=duration',
-                '-of', 'default=noprint_wrappers=1:nokey=1',
-                audio_path
-            ]
-            duration = float(subprocess.check_output(probe_cmd).decode().strip())
-            logger.debug(f"Audio duration: {duration} seconds")
-        except subprocess.CalledProcessError as e:
-            logger.error(f"Error probing audio file: {str(e)}")
-            duration = 10  # Fallback duration
-
-        # Construct FFmpeg command
-        ffmpeg_cmd = [
-            'ffmpeg',
-            # Input 1: Create black background
-            '-f', 'lavfi',
-            '-i', f'color=c=black:s=1280x720:d={duration}',
-            # Input 2: PNG avatar image
-            '-i', png_path,
-            # Input 3: Audio file
-            '-i', audio_path,
-            # Video filters
+def x264_args(profile: dict, still_image: bool = False) -> list:
+    args = ['-c:v', 'libx264', '-preset', profile['preset'], '-crf', str(profile['crf'])]
+    if still_image:
+        args += ['-tune', 'stillimage']
+    return args
+
+def build_tracks(audio_path: str, duration: float, fps: float) -> Tuple["LipSyncTimeline", "KeyframeTrack"]:
+    """Lip sync and head motion tracks for an utterance, shared by renders and /timeline"""
+    from lip_sync import LipSync
+    from animation_engine import AnimationEngine
+
+    with timed('lip_sync'):
+        # Word boundaries recorded during synthesis spare decoding the audio
+        metadata = get_speech_metadata(audio_path) or {}
+        lip_movements = LipSync().analyze_speech(audio_path, metadata.get('boundaries'), duration)
+        engine = AnimationEngine(fps=fps)
+        motion = engine.blend_animations(
+            [engine.generate_animation(duration, 'talk'), engine.generate_animation(duration, 'idle')],
+            [0.7, 0.3]
+        )
+    return lip_movements, motion
+
+def render_animated(avatar_url: str, audio_path: str, duration: float, output_file: str,
+                    profile: dict = None) -> None:
+    """Render lip sync and gesture tracks into raw frames and stream them into ffmpeg"""
+    profile = profile or get_profile()
+    width, height, fps = profile['width'], profile['height'], profile['fps']
+
+    # Heavy modules are only needed for animated renders
+    from frame_renderer import TalkingHeadRenderer, avatar_style, decode_avatar, encode_frames
+
+    size = min(width, height)
+    avatar = decode_avatar(avatar_store.get_png(avatar_url, size, size))
+
+    lip_movements, motion = build_tracks(audio_path, duration, fps)
+
+    renderer = TalkingHeadRenderer(avatar, width, height, fps, style=avatar_style(avatar_url))
+    # Frames are drawn lazily as ffmpeg consumes them, so this covers drawing and encoding
+    with timed('encode'):
+        encode_frames(
+            renderer.render(lip_movements, motion, duration),
+            width, height, fps, audio_path, output_file, x264_args(profile), duration
+        )
+
+def static_ffmpeg_cmd(png_path: str, audio_input: str, output_file: str, profile: dict,
+                      audio_format: str = None, fps: float = STATIC_FPS, duration: float = None) -> list:
+    """FFmpeg command that loops a still avatar over the given audio input.
+
+    With a duration the output is cut to it; otherwise -shortest ends it
+    with the last whole frame after the audio, up to 1/fps late.
+    """
+    width, height = profile['width'], profile['height']
+    if audio_format:
+        # A piped audio stream can arrive slower than the looped image is
+        # encoded, and -shortest alone lets video run ahead by the muxer's
+        # interleave window. Drive the canvas from the audio instead: an
+        # invisible showwaves layer ends exactly when the audio does.
+        video_args = [
             '-filter_complex',
-            '[1:v]scale=720:-1[avatar];[avatar]pad=1280:720:(ow-iw)/2:(oh-ih)/2[scaled];[0:v][scaled]overlay=0:0',
-            # Output options
-            '-c:a', 'aac',
-            '-c:v', 'libx264',
-            '-preset', 'medium',
-            '-pix_fmt', 'yuv420p',
-            '-movflags', '+faststart',
-            '-y',  # Overwrite output file if exists
-            output_file
+            f'[1:a]asplit=2[aout][aw];'
+            f'[aw]showwaves=s={width}x{height}:r={fps}:colors=black[bg];'
+            f'[bg][0:v]overlay=(W-w)/2:(H-h)/2:shortest=1[v]',
+            '-map', '[v]', '-map', '[aout]'
         ]
+    else:
+        # Center the avatar on a black canvas of the profile size
+        video_args = ['-vf', f'pad={width}:{height}:(ow-iw)/2:(oh-ih)/2:black']
+    return [
+        'ffmpeg',
+        # Input 1: PNG avatar image, repeated at a low frame rate
+        '-loop', '1', '-framerate', str(fps),
+        '-i', png_path,
+        # Input 2: Audio file, or a pipe when streaming
+        *(['-f', audio_format] if audio_format else []),
+        '-i', audio_input,
+        *video_args,
+        # Output options
+        '-c:a', 'aac',
+        *x264_args(profile, still_image=True),
+        '-pix_fmt', 'yuv420p',
+        '-movflags', '+faststart',
+        '-shortest',
+        *(['-t', f'{duration:.3f}'] if duration else []),
+        '-y',  # Overwrite output file if exists
+        output_file
+    ]
 
-        # Execute FFmpeg command
-        logger.debug(f"Running FFmpeg command: {' '.join(ffmpeg_cmd)}")
-        process = subprocess.run(
-            ffmpeg_cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True
-        )
+def new_output_path(directory: str = 'output') -> str:
+    """Unique video path; timestamps collide when renders run in parallel"""
+    return os.path.join(directory, f"video_{uuid.uuid4().hex}.mp4")
+
+def render_static(png_path: str, audio_path: str, output_file: str, profile: dict = None,
+                  segment: bool = False) -> None:
+    """Encode a looped still avatar at a low frame rate, with no per-frame compositing.
+
+    A segment is encoded at the profile frame rate and cut to its audio: at
+    STATIC_FPS its video could run up to half a second past the speech,
+    which concatenation turns into a silent gap at every join.
+    """
+    profile = profile or get_profile()
+    duration = speech_duration(audio_path)
+    ffmpeg_cmd = static_ffmpeg_cmd(png_path, audio_path, output_file, profile,
+                                   fps=profile['fps'] if segment else STATIC_FPS,
+                                   duration=duration if segment else None)
+
+    # Execute FFmpeg command
+    logger.debug(f"Running FFmpeg command: {' '.join(ffmpeg_cmd)}")
+    with timed('encode'):
+        process = FFmpegProcess(ffmpeg_cmd, 'encode', duration=duration)
+        returncode = process.wait()
 
-        if process.returncode != 0:
-            logger.error(f"FFmpeg error: {process.stderr}")
-            raise Exception(f"FFmpeg processing failed: {process.stderr}")
+    if returncode != 0:
+        message = process.error_message()
+        logger.error(f"FFmpeg error: {message}")
+        raise Exception(f"FFmpeg processing failed: {message}")
 
-        # Cleanup temporary PNG file
+def create_video(avatar_url: str, audio_path: str, text: str, mode: str = None,
+                 profile: str = None, output_file: str = None, segment: bool = False) -> str:
+    """Create video with avatar animation and audio; ``segment`` for parts that will be concatenated"""
+    mode = mode or DEFAULT_RENDER_MODE
+    try:
+        encoding = get_profile(profile)
+
+        # Create output directory if it doesn't exist
+        os.makedirs("output", exist_ok=True)
+
+        if output_file is None:
+            output_file = new_output_path()
+
+        # Fetch the avatar rasterized to fit the profile (cached by URL and size)
+        avatar_size = min(encoding['width'], encoding['height'])
         try:
-            os.remove(png_path)
+            png_path = avatar_store.get_png_path(avatar_url, avatar_size, avatar_size)
         except Exception as e:
-            logger.warning(f"Failed to cleanup temporary PNG file: {str(e)}")
+            logger.error(f"Error converting SVG to PNG: {str(e)}")
+            raise Exception(f"Failed to process avatar image: {str(e)}")
+
+        if mode == 'animated':
+            # Duration comes from the TTS metadata or the MP3 headers; no probe process
+            with timed('probe'):
+                duration = speech_duration(audio_path)
+            if duration is None:
+                raise Exception(f"Could not determine audio duration: {audio_path}")
+            logger.debug(f"Audio duration: {duration} seconds")
+
+            render_animated(avatar_url, audio_path, duration, output_file, encoding)
+        else:
+            render_static(png_path, audio_path, output_file, encoding, segment=segment)
 
         if os.path.exists(output_file):
             logger.info(f"Successfully created video: {output_file}")
@@ -101,4 +205,79 @@ def create_video(avatar_url: str, audio_path: str, text: str) -> str:
 
     except Exception as e:
         logger.error(f"Error creating video: {str(e)}")
-        raise Exception(f"Failed to create video: {str(e)}")
\ No newline at end of file
+        raise Exception(f"Failed to create video: {str(e)}")
+
+async def create_video_streaming_async(avatar_url: str, text: str, voice: str, profile: str = None,
+                                       output_file: str = None) -> Tuple[str, str]:
+    """Synthesize speech and encode a static video at the same time.
+
+    Audio chunks from Edge TTS are piped into ffmpeg as they arrive while the
+    avatar is rasterized on a worker thread, so total latency approaches the
+    slower of TTS and encoding instead of their sum. Returns
+    ``(video_path, audio_path)``.
+    """
+    encoding = get_profile(profile)
+    avatar_size = min(encoding['width'], encoding['height'])
+    loop = asyncio.get_running_loop()
+
+    if output_file is None:
+        os.makedirs("output", exist_ok=True)
+        output_file = new_output_path()
+
+    # Rasterize the avatar while the TTS connection starts producing audio
+    started = time.perf_counter()
+    raster = loop.run_in_executor(None, contextvars.copy_context().run,
+                                  avatar_store.get_png_path, avatar_url, avatar_size, avatar_size)
+    speech = stream_speech(text, voice)
+    first_chunk = asyncio.ensure_future(speech.__anext__())
+    try:
+        png_path, chunk = await asyncio.gather(raster, first_chunk)
+    except Exception:
+        # A failed raster leaves the generator suspended mid-__anext__, and
+        # aclose() on a running generator raises over the real error
+        first_chunk.cancel()
+        await asyncio.gather(first_chunk, return_exceptions=True)
+        await speech.aclose()
+        raise
+    record_stage('tts_first_chunk', time.perf_counter() - started)
+
+    ffmpeg_cmd = static_ffmpeg_cmd(png_path, 'pipe:0', output_file, encoding, audio_format='mp3')
+    logger.debug(f"Running streaming FFmpeg command: {' '.join(ffmpeg_cmd)}")
+    # The total duration isn't known until TTS finishes, so progress is output time only
+    process = FFmpegProcess(ffmpeg_cmd, 'stream_encode', stdin=True)
+    try:
+        # Pipe writes block when ffmpeg falls behind; keep them off the event loop
+        await loop.run_in_executor(None, process.write, chunk)
+        async for chunk in speech:
+            await loop.run_in_executor(None, process.write, chunk)
+    except BrokenPipeError:
+        logger.error("FFmpeg closed its input early")
+    except Exception:
+        process.kill()
+        await loop.run_in_executor(None, process.wait)
+        raise
+    finally:
+        process.close_stdin()
+        await speech.aclose()
+
+    returncode = await loop.run_in_executor(None, process.wait)
+    # TTS and encoding overlap here, so they are timed as one stage
+    record_stage('stream_encode', time.perf_counter() - started)
+    if returncode != 0:
+        message = process.error_message()
+        logger.error(f"FFmpeg error: {message}")
+        raise Exception(f"FFmpeg processing failed: {message}")
+
+    if not os.path.exists(output_file):
+        raise Exception("Output file was not created")
+    logger.info(f"Successfully created streamed video: {output_file}")
+    return output_file, speech_cache.path_for(speech_cache_key(text, voice))
+
+def create_video_streaming(avatar_url: str, text: str, voice: str, profile: str = None,
+                           output_file: str = None) -> Tuple[str, str]:
+    """Synchronous wrapper for the streaming TTS-to-video pipeline, run on the shared TTS loop"""
+    try:
+        return tts_loop.run(create_video_streaming_async(avatar_url, text, voice, profile, output_file))
+    except Exception as e:
+        logger.error(f"Error creating streamed video: {str(e)}")
+        raise Exception(f"Failed to create video: {str(e)}")